@@ -1,18 +1,211 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
-from datetime import datetime
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, flash, abort, send_file, g
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from werkzeug.security import safe_join
+from datetime import datetime, date, timedelta
 import os
+import json
+import sqlite3
+import zlib
+import hashlib
+import hmac
+import queue
+import time
+import gc
+import gzip
+import heapq
+import itertools
+import math
+import mimetypes
+import multiprocessing
+from bisect import bisect_left
 import logging
+import logging.handlers
 import random
-from functools import wraps
+import re
+import secrets
+import string
+import sys
+import threading
+import unicodedata
+import atexit
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache, wraps
+from types import MappingProxyType
 
-# Configurar logging para depuração
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import exportacao
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele só é gerada a variante gzip
+    brotli = None
+
+class FormatadorJSON(logging.Formatter):
+    """Formata cada registo como uma linha JSON, incluindo os campos de `extra`."""
+
+    CAMPOS_PADRAO = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        dados = {
+            'data': self.formatTime(record),
+            'nivel': record.levelname,
+            'mensagem': record.getMessage()
+        }
+        dados.update((k, v) for k, v in vars(record).items() if k not in self.CAMPOS_PADRAO)
+        if record.exc_info:
+            dados['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+class HandlerEmLote(logging.Handler):
+    """Acumula registos e escreve-os de uma vez no stream de destino.
+
+    O lote é escrito quando atinge `tamanho`, quando passa `intervalo`
+    segundos desde a última escrita, ou de imediato para erros.
+    """
+
+    def __init__(self, stream=None, tamanho=100, intervalo=0.5):
+        super().__init__()
+        self.stream = stream or sys.stderr
+        self.tamanho = tamanho
+        self.intervalo = intervalo
+        self._linhas = []
+        self._ultima_escrita = time.monotonic()
+
+    def emit(self, record):
+        try:
+            self._linhas.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if (record.levelno >= logging.ERROR or len(self._linhas) >= self.tamanho
+                or time.monotonic() - self._ultima_escrita >= self.intervalo):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self._linhas:
+                self.stream.write('\n'.join(self._linhas) + '\n')
+                self.stream.flush()
+                self._linhas = []
+            self._ultima_escrita = time.monotonic()
+
+class ListenerEmLote(logging.handlers.QueueListener):
+    """QueueListener que escreve o lote pendente quando a fila fica parada."""
+
+    def __init__(self, fila, *handlers, intervalo=0.5):
+        super().__init__(fila, *handlers)
+        self.intervalo = intervalo
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.intervalo)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+    def reiniciar_apos_fork(self):
+        """O thread do listener não sobrevive ao fork (p. ex. gunicorn --preload)."""
+        self._thread = None
+        self.start()
+
+class QueueHandlerLimitado(logging.handlers.QueueHandler):
+    """QueueHandler que não formata no thread do pedido e nunca perde avisos/erros.
+
+    Com a fila cheia, registos abaixo de WARNING são descartados (e
+    contados); avisos e erros esperam por espaço na fila.
+    """
+
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # O listener corre no mesmo processo: a formatação fica para ele
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record)
+            else:
+                self.descartados += 1
+
+class FiltroAmostragem(logging.Filter):
+    """Deixa passar só uma fração dos registos INFO/DEBUG de cada rota.
+
+    A rota vem de `extra={'rota': ...}`; avisos e erros passam sempre.
+    """
+
+    def __init__(self, taxas):
+        super().__init__()
+        self.taxas = taxas
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        taxa = self.taxas.get(getattr(record, 'rota', None), 1.0)
+        return taxa >= 1.0 or random.random() < taxa
+
+def _ler_taxas(texto):
+    """Converte "gerar=0.1,login=1" em {'gerar': 0.1, 'login': 1.0}."""
+    taxas = {}
+    for item in filter(None, (parte.strip() for parte in texto.split(','))):
+        rota, _, taxa = item.partition('=')
+        taxas[rota.strip()] = float(taxa)
+    return taxas
+
+def configurar_logging():
+    """Logging assíncrono: os pedidos só põem registos numa fila; um thread
+    de fundo formata-os e escreve-os em lotes.
+
+    PLANOAULA_LOG_NIVEL    nível mínimo (padrão INFO)
+    PLANOAULA_LOG_FORMATO  "texto" (padrão) ou "json"
+    PLANOAULA_LOG_AMOSTRAS taxas por rota para registos INFO, p. ex. "gerar=0.1"
+    """
+    if os.environ.get('PLANOAULA_LOG_FORMATO') == 'json':
+        formatador = FormatadorJSON()
+    else:
+        formatador = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    destino = HandlerEmLote()
+    destino.setFormatter(formatador)
+
+    fila = queue.Queue(maxsize=10000)
+    handler = QueueHandlerLimitado(fila)
+    handler.addFilter(FiltroAmostragem(_ler_taxas(os.environ.get('PLANOAULA_LOG_AMOSTRAS', ''))))
+    listener = ListenerEmLote(fila, destino)
+
+    raiz = logging.getLogger()
+    raiz.setLevel(os.environ.get('PLANOAULA_LOG_NIVEL', 'INFO').upper())
+    raiz.handlers[:] = [handler]
+
+    def parar():
+        listener.stop()
+        destino.flush()
+
+    listener.start()
+    atexit.register(parar)
+    os.register_at_fork(after_in_child=listener.reiniciar_apos_fork)
+    return listener
+
+log_listener = configurar_logging()
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+# A rota /static é servida por `arquivo_estatico` (ver abaixo)
+app = Flask(__name__, static_folder=None)
+STATIC_DIR = os.path.join(app.root_path, 'static')
 app.secret_key = 'sua_chave_secreta_aqui_123456'  # Necessário para sessões e flash
+# GET /gerar grava o plano (a interface usa GET para reaproveitar o ETag): com
+# SameSite=Strict, nenhum link ou imagem de outro site chega autenticado a
+# uma rota. Em contrapartida, quem chega por um link externo vê o login.
+app.config['SESSION_COOKIE_SAMESITE'] = 'Strict'
 
-# Usuários fixos para autenticação (substitua por um banco de dados em produção)
+# Usuários criados na primeira inicialização da base de credenciais
 USERS = {
     'admin': 'senha123',
     'Rivaldo': 'manejo12'
@@ -28,73 +221,542 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Usuários com acesso às ferramentas de diagnóstico (perfis)
+ADMINISTRADORES = set(os.environ.get('PLANOAULA_ADMINS', 'admin').split(','))
+
+def admin_required(f):
+    """Decorador para rotas reservadas aos administradores."""
+    @wraps(f)
+    @login_required
+    def decorated_function(*args, **kwargs):
+        if session['user'] not in ADMINISTRADORES:
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated_function
+
+class PerfilColapsado:
+    """Perfil de uma chamada no formato de pilhas colapsadas (flame graph).
+
+    Usa sys.setprofile na thread atual: cada pilha "a;b;c" acumula o tempo
+    próprio (em microssegundos) passado no seu topo.
+    """
+
+    def __init__(self):
+        self.tempos = {}
+        self._pilha = []
+        self._ultimo = 0
+
+    def _evento(self, frame, evento, arg):
+        agora = time.perf_counter_ns()
+        if self._pilha:
+            topo = self._pilha[-1]
+            self.tempos[topo] = self.tempos.get(topo, 0) + agora - self._ultimo
+        if evento == 'call':
+            nome = f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+            self._pilha.append(f"{self._pilha[-1]};{nome}" if self._pilha else nome)
+        elif evento == 'c_call':
+            nome = getattr(arg, '__qualname__', repr(arg))
+            self._pilha.append(f"{self._pilha[-1]};{nome}" if self._pilha else nome)
+        elif self._pilha:
+            self._pilha.pop()
+        self._ultimo = time.perf_counter_ns()
+
+    def executar(self, funcao, *args, **kwargs):
+        self._ultimo = time.perf_counter_ns()
+        sys.setprofile(self._evento)
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            sys.setprofile(None)
+
+    def colapsado(self):
+        """Linhas "pilha microssegundos", prontas para o flamegraph.pl/speedscope."""
+        return '\n'.join(f"{pilha} {ns // 1000}" for pilha, ns in sorted(self.tempos.items()) if ns >= 1000) + '\n'
+
+class RegistoPerfis:
+    """Guarda os N perfis mais lentos (os restantes são descartados)."""
+
+    def __init__(self, capacidade=20):
+        self.capacidade = capacidade
+        self._heap = []  # (duracao, id, registro); o mais rápido no topo
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def guardar(self, rota, usuario, duracao, perfil):
+        registro = {
+            'id': next(self._ids),
+            'rota': rota,
+            'usuario': usuario,
+            'duracao_ms': duracao * 1000,
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'colapsado': perfil.colapsado()
+        }
+        with self._lock:
+            item = (duracao, registro['id'], registro)
+            if len(self._heap) < self.capacidade:
+                heapq.heappush(self._heap, item)
+            else:
+                heapq.heappushpop(self._heap, item)
+        return registro['id']
+
+    def listar(self):
+        with self._lock:
+            registros = [registro for _, _, registro in self._heap]
+        return sorted(({k: v for k, v in r.items() if k != 'colapsado'} for r in registros),
+                      key=lambda r: r['duracao_ms'], reverse=True)
+
+    def obter(self, perfil_id):
+        with self._lock:
+            for _, _, registro in self._heap:
+                if registro['id'] == perfil_id:
+                    return registro
+        return None
+
+# Fração de pedidos perfilados em segundo plano (0 desativa)
+PERFIL_AMOSTRA = float(os.environ.get('PLANOAULA_PERFIL_AMOSTRA', 0))
+registo_perfis = RegistoPerfis(capacidade=int(os.environ.get('PLANOAULA_PERFIL_CAPACIDADE', 20)))
+
+def perfilavel(f):
+    """Decorador que permite perfilar a rota.
+
+    Um administrador pode pedir o perfil de um pedido com o cabeçalho
+    `X-Perfil: 1` ou `?perfil=1`; além disso, uma fração PERFIL_AMOSTRA dos
+    pedidos é perfilada em segundo plano. Os perfis ficam em `registo_perfis`
+    (os N mais lentos) e o id vai no cabeçalho X-Perfil-Id. Deve ficar
+    antes de @login_required para que a autenticação entre no perfil.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        pedido = (request.headers.get('X-Perfil') == '1' or request.args.get('perfil') == '1') \
+            and session.get('user') in ADMINISTRADORES
+        if not pedido and not (PERFIL_AMOSTRA and random.random() < PERFIL_AMOSTRA):
+            return f(*args, **kwargs)
+
+        perfil = PerfilColapsado()
+        inicio = time.perf_counter()
+        resposta = app.make_response(perfil.executar(f, *args, **kwargs))
+        perfil_id = registo_perfis.guardar(request.path, session.get('user'), time.perf_counter() - inicio, perfil)
+        if pedido:
+            resposta.headers['X-Perfil-Id'] = str(perfil_id)
+        return resposta
+    return decorated_function
+
+class Cronometro:
+    """Mede a duração de um bloco `with` e regista-a num histograma."""
+
+    __slots__ = ('metricas', 'estagio', 'inicio')
+
+    def __init__(self, metricas, estagio):
+        self.metricas = metricas
+        self.estagio = estagio
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metricas.observar(self.estagio, time.perf_counter() - self.inicio)
+        return False
+
+class Metricas:
+    """Histogramas de duração por estágio e contadores com rótulos.
+
+    Os valores são do processo atual; com vários workers, o Prometheus
+    deve recolher cada um (ou somar as séries).
+    """
+
+    LIMITES = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histogramas = {}  # estagio -> [contagens por limite (+Inf no fim), soma]
+        self._contadores = {}   # (nome, rotulos) -> valor
+
+    def cronometro(self, estagio):
+        return Cronometro(self, estagio)
+
+    def observar(self, estagio, segundos):
+        indice = bisect_left(self.LIMITES, segundos)
+        with self._lock:
+            histograma = self._histogramas.get(estagio)
+            if histograma is None:
+                histograma = self._histogramas[estagio] = [[0] * (len(self.LIMITES) + 1), 0.0]
+            histograma[0][indice] += 1
+            histograma[1] += segundos
+
+    def contar(self, nome, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + 1
+
+    @staticmethod
+    def _rotulos(pares):
+        if not pares:
+            return ''
+        return '{' + ','.join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                              for k, v in pares) + '}'
+
+    def exportar(self, extras=()):
+        """Texto no formato de exposição do Prometheus.
+
+        `extras` são séries adicionais (nome, tipo, valor), p. ex. do cache.
+        """
+        linhas = []
+        with self._lock:
+            histogramas = {k: (list(v[0]), v[1]) for k, v in self._histogramas.items()}
+            contadores = dict(self._contadores)
+
+        linhas.append('# HELP planoaula_estagio_segundos Duração de cada estágio da geração de planos.')
+        linhas.append('# TYPE planoaula_estagio_segundos histogram')
+        for estagio, (contagens, soma) in sorted(histogramas.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.LIMITES + ('+Inf',), contagens):
+                acumulado += contagem
+                linhas.append(f'planoaula_estagio_segundos_bucket{{estagio="{estagio}",le="{limite}"}} {acumulado}')
+            linhas.append(f'planoaula_estagio_segundos_sum{{estagio="{estagio}"}} {soma}')
+            linhas.append(f'planoaula_estagio_segundos_count{{estagio="{estagio}"}} {acumulado}')
+
+        tipos = set()
+        for (nome, rotulos), valor in sorted(contadores.items()):
+            if nome not in tipos:
+                linhas.append(f'# TYPE {nome} counter')
+                tipos.add(nome)
+            linhas.append(f'{nome}{self._rotulos(rotulos)} {valor}')
+
+        for nome, tipo, valor in extras:
+            linhas.append(f'# TYPE {nome} {tipo}')
+            linhas.append(f'{nome} {valor}')
+        return '\n'.join(linhas) + '\n'
+
+# Métricas da geração (PLANOAULA_METRICAS=0 desativa). Desativadas, `cronometro`
+# devolve sempre o mesmo contexto vazio e `contar` não faz nada.
+METRICAS_ATIVAS = os.environ.get('PLANOAULA_METRICAS', '1') != '0'
+_SEM_CRONOMETRO = nullcontext()
+if METRICAS_ATIVAS:
+    metricas = Metricas()
+    cronometro = metricas.cronometro
+    contar = metricas.contar
+else:
+    metricas = None
+    cronometro = lambda estagio: _SEM_CRONOMETRO  # noqa: E731
+    contar = lambda nome, **rotulos: None  # noqa: E731
+
+# Catálogo de currículo (objetivos, conteúdos e técnicas de ensino)
+CAMINHO_CURRICULO = os.environ.get(
+    'PLANOAULA_CURRICULO', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'curriculo.json')
+)
+
+class ModeloTexto:
+    """Texto do catálogo com o marcador {tema}, analisado no carregamento.
+
+    Guarda só os trechos literais; `formatar` junta-os com o tema.
+    """
+
+    __slots__ = ('literais',)
+
+    def __init__(self, texto):
+        literais = ['']
+        for literal, campo, especificacao, conversao in string.Formatter().parse(texto):
+            literais[-1] += literal
+            if campo is None:
+                continue
+            if campo != 'tema' or especificacao or conversao:
+                raise ValueError(f"Marcador inválido em {texto!r}: só {{tema}} é permitido")
+            literais.append('')
+        self.literais = tuple(literais)
+
+    def formatar(self, tema):
+        return tema.join(self.literais)
+
+class EntradaCurriculo:
+    """Conteúdo resolvido do catálogo para uma (disciplina, classe, foco)."""
+
+    __slots__ = ('objetivos', 'conteudos', 'tecnicas')
+
+    def __init__(self, objetivos, conteudos, tecnicas):
+        self.objetivos = objetivos
+        self.conteudos = conteudos
+        self.tecnicas = tecnicas
+
+class CatalogoCurriculo:
+    """Catálogo de currículo carregado de um arquivo JSON.
+
+    O arquivo tem os padrões por foco ("objetivos", "tecnicas") e por
+    disciplina ("conteudos"), com "*" como valor para chaves desconhecidas,
+    e uma lista "entradas" com conteúdo específico de uma (disciplina,
+    classe, foco), cujos campos substituem os padrões. Na carga, os textos
+    são analisados e todas as combinações conhecidas ficam num índice, de
+    modo que `obter` é um acesso a dicionário. O arquivo é recarregado
+    quando muda (verificado no máximo uma vez por `intervalo` segundos);
+    se a nova versão for inválida, mantém-se a anterior.
+    """
+
+    def __init__(self, caminho, intervalo=1.0):
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self.versao = 0
+        self._assinatura = None
+        self._proxima_verificacao = 0.0
+        self._lock = threading.Lock()
+        self._carregar(self._assinatura_arquivo())
+
+    def _assinatura_arquivo(self):
+        estado = os.stat(self.caminho)
+        return (estado.st_mtime_ns, estado.st_size)
+
+    def _carregar(self, assinatura):
+        with open(self.caminho, encoding='utf-8') as f:
+            dados = json.load(f)
+
+        def modelos(textos):
+            return tuple(ModeloTexto(texto) for texto in textos)
+
+        # Tudo é montado em variáveis locais e só atribuído no fim: um
+        # arquivo inválido não deixa o catálogo meio atualizado
+        padroes = (
+            {foco: modelos(textos) for foco, textos in dados['objetivos'].items()},
+            {disciplina: modelos(textos) for disciplina, textos in dados['conteudos'].items()},
+            {foco: tuple(tecnicas) for foco, tecnicas in dados['tecnicas'].items()},
+        )
+
+        indice = {}
+        for disciplina, classe, foco in itertools.product(
+                PlanoAulaGenerator.DISCIPLINAS, PlanoAulaGenerator.CLASSES, PlanoAulaGenerator.FOCOS):
+            indice[(disciplina, classe, foco)] = self._montar_padrao(padroes, disciplina, foco)
+        for entrada in dados.get('entradas', []):
+            chave = (entrada['disciplina'], entrada['classe'], entrada['foco'])
+            padrao = indice.get(chave) or self._montar_padrao(padroes, *chave[::2])
+            indice[chave] = EntradaCurriculo(
+                modelos(entrada['objetivos']) if 'objetivos' in entrada else padrao.objetivos,
+                modelos(entrada['conteudos']) if 'conteudos' in entrada else padrao.conteudos,
+                tuple(entrada['tecnicas']) if 'tecnicas' in entrada else padrao.tecnicas
+            )
+        self._padroes, self._indice = padroes, indice
+        self._assinatura = assinatura
+        self.versao += 1
+
+    @staticmethod
+    def _montar_padrao(padroes, disciplina, foco):
+        """Entrada montada só com os padrões (objetivos, conteúdos, técnicas)
+        por foco e por disciplina."""
+        objetivos, conteudos, tecnicas = padroes
+        return EntradaCurriculo(
+            objetivos.get(foco) or objetivos['*'],
+            conteudos.get(disciplina) or conteudos['*'],
+            tecnicas[foco] if foco in tecnicas else tecnicas['*']
+        )
+
+    def _padrao(self, disciplina, foco):
+        """Entrada montada só com os padrões da versão atual."""
+        return self._montar_padrao(self._padroes, disciplina, foco)
+
+    def atualizar(self):
+        """Recarrega o arquivo se tiver mudado; devolve a versão atual."""
+        agora = time.monotonic()
+        if agora < self._proxima_verificacao:
+            return self.versao
+        with self._lock:
+            if agora >= self._proxima_verificacao:
+                self._proxima_verificacao = agora + self.intervalo
+                try:
+                    assinatura = self._assinatura_arquivo()
+                except OSError as e:
+                    logger.error("Catálogo de currículo inacessível, mantida a versão anterior: %s", e)
+                    return self.versao
+                if assinatura != self._assinatura:
+                    try:
+                        self._carregar(assinatura)
+                        logger.info("Catálogo de currículo recarregado (versão %d)", self.versao)
+                    except (OSError, ValueError, KeyError, TypeError) as e:
+                        # Não voltar a tentar até o arquivo mudar outra vez
+                        self._assinatura = assinatura
+                        logger.error("Catálogo de currículo inválido, mantida a versão anterior: %s", e)
+        return self.versao
+
+    def obter(self, disciplina, classe, foco):
+        """Conteúdo para (disciplina, classe, foco); fora do índice, usa os padrões."""
+        entrada = self._indice.get((disciplina, classe, foco))
+        if entrada is None:
+            entrada = self._padrao(disciplina, foco)
+        return entrada
+
+# Peso de cada função didática na duração da aula (45 minutos -> 5/20/15/5)
+PESOS_FUNCOES_DIDATICAS = (1, 4, 3, 1)
+
+@lru_cache(maxsize=1024)
+def repartir_duracao(duracao, pesos=PESOS_FUNCOES_DIDATICAS):
+    """Divide a duração (em minutos inteiros) proporcionalmente aos pesos.
+
+    Usa o método dos maiores restos, em aritmética inteira: a soma das
+    partes é sempre igual à duração. O resultado fica em memória.
+    """
+    total = sum(pesos)
+    partes, restos = zip(*(divmod(duracao * peso, total) for peso in pesos))
+    partes = list(partes)
+    maiores_restos = sorted(range(len(pesos)), key=lambda i: -restos[i])
+    for indice in maiores_restos[:duracao - sum(partes)]:
+        partes[indice] += 1
+    return tuple(partes)
+
+def repartir_duracoes(duracoes, pesos=PESOS_FUNCOES_DIDATICAS):
+    """Reparte todas as durações de um horário numa só chamada.
+
+    Cada duração distinta é calculada uma só vez.
+    """
+    reparticoes = {duracao: repartir_duracao(duracao, pesos) for duracao in set(duracoes)}
+    return [reparticoes[duracao] for duracao in duracoes]
+
+# Linha do cronograma; as partes fixas são partilhadas entre planos
+LinhaCronograma = namedtuple('LinhaCronograma',
+                             ['tempo', 'funcao', 'conteudo', 'ativ_professor', 'ativ_aluno', 'tecnica', 'meios'])
+
+# Marcadores usados na compilação dos templates de plano
+_SLOT_TEMA = '\x00'
+_SLOT_CLASSE = '\x01'
+_SLOT_DATA = '\x02'
+_SLOT_CELULA = '\x03'
+_RE_SLOTS = re.compile('([\x00-\x03])')
+
+class PlanoTemplate:
+    """Plano pré-compilado: fragmentos estáticos intercalados com slots.
+
+    Cada slot é um marcador (tema, classe ou data) ou uma célula da tabela
+    do cronograma, representada por (prefixo, sufixo, largura).
+    `impressao` é um hash do template, que muda sempre que o texto muda.
+    """
+
+    __slots__ = ('fragmentos', 'slots', 'impressao', 'comprimento')
+
+    def __init__(self, texto, celulas):
+        partes = _RE_SLOTS.split(texto)
+        celulas = iter(celulas)
+        self.fragmentos = tuple(partes[0::2])
+        self.slots = tuple(next(celulas) if marca == _SLOT_CELULA else marca for marca in partes[1::2])
+        self.impressao = hashlib.sha256(repr((self.fragmentos, self.slots)).encode('utf-8')).hexdigest()[:16]
+        self.comprimento = sum(map(len, self.fragmentos))
+
+    def render(self, tema, classe, data):
+        """Preenche os slots e devolve o texto do plano."""
+        valores = {_SLOT_TEMA: tema, _SLOT_CLASSE: classe, _SLOT_DATA: data}
+        fragmentos = self.fragmentos
+        partes = [fragmentos[0]]
+        for fragmento, slot in zip(fragmentos[1:], self.slots):
+            if slot.__class__ is tuple:
+                prefixo, sufixo, largura = slot
+                partes.append((prefixo + tema + sufixo).ljust(largura))
+            else:
+                partes.append(valores[slot])
+            partes.append(fragmento)
+        return "".join(partes)
+
+    def estimar_comprimento(self, tema):
+        """Número aproximado de caracteres do texto renderizado, sem o renderizar."""
+        return self.comprimento + len(self.slots) * len(tema)
+
+class PlanoAula:
+    """Plano de aula gerado por PlanoAulaGenerator.criar_plano.
+
+    Guarda os campos de entrada; a estrutura (`como_dict`: cabeçalho, listas
+    e linhas do cronograma) e o texto formatado (`texto`) só são produzidos
+    quando pedidos, e ficam memorizados. Quem consome o JSON não paga a
+    formatação do texto, e vice-versa.
+    """
+
+    __slots__ = ('tema', 'disciplina', 'classe', 'duracao', 'foco', 'data', '_gerador', '_template',
+                 '_texto', '_estrutura')
+
+    def __init__(self, gerador, template, tema, disciplina, classe, duracao, foco, data):
+        self.tema = tema
+        self.disciplina = disciplina
+        self.classe = classe
+        self.duracao = duracao
+        self.foco = foco
+        self.data = data
+        self._gerador = gerador
+        self._template = template
+        self._texto = None
+        self._estrutura = None
+
+    @property
+    def texto(self):
+        """Texto formatado do plano (com a tabela ASCII do cronograma)."""
+        if self._texto is None:
+            with cronometro('render'):
+                self._texto = self._template.render(self.tema, self.classe, self.data)
+        return self._texto
+
+    def como_dict(self):
+        """Plano estruturado, pronto a serializar em JSON."""
+        if self._estrutura is None:
+            with cronometro('estruturar'):
+                self._estrutura = self._gerador.estruturar_plano(
+                    self.tema, self.disciplina, self.classe, self.duracao, self.foco, self.data
+                )
+        return self._estrutura
+
+    def __str__(self):
+        return self.texto
+
+    def __sizeof__(self):
+        # Conta o texto e a estrutura (de tamanho semelhante) mesmo antes de
+        # serem produzidos, para o limite em bytes do cache de planos
+        return object.__sizeof__(self) + 2 * self._template.estimar_comprimento(self.tema)
+
+_TABELA_VAZIA = MappingProxyType({})
+
 class PlanoAulaGenerator:
     """Classe para gerar planos de aula personalizados."""
     
     DISCIPLINAS = ['História', 'Geografia', 'Português', 'Matemática', 'Biologia', 'Física', 'Química', 'Inglês', 'Educação Física']
     CLASSES = ['7ª Classe', '8ª Classe', '9ª Classe', '10ª Classe', '11ª Classe', '12ª Classe']
-    DURACOES = [45, 90]
+    # Durações aceites (minutos); qualquer duração pode ser repartida por repartir_duracao
+    DURACOES = [int(d) for d in os.environ.get('PLANOAULA_DURACOES', '45,50,60,90,135').split(',')]
     FOCOS = ['Teórica', 'Prática/Experimental', 'Revisão', 'Avaliação', 'Introdução']
 
-    def __init__(self):
-        self.objetivos_base = {
-            'Teórica': lambda tema: [
-                f"Compreender os conceitos fundamentais de {tema}.",
-                f"Analisar criticamente os aspectos principais de {tema}.",
-                f"Relacionar {tema} com contextos históricos ou sociais."
-            ],
-            'Prática/Experimental': lambda tema: [
-                f"Aplicar {tema} em exercícios práticos.",
-                f"Desenvolver habilidades experimentais relacionadas a {tema}.",
-                "Trabalhar em grupo para resolver problemas."
-            ],
-            'Revisão': lambda tema: [
-                f"Revisar os principais pontos de {tema}.",
-                f"Consolidar o aprendizado sobre {tema} com exercícios.",
-                "Esclarecer dúvidas dos alunos."
-            ],
-            'Avaliação': lambda tema: [
-                f"Avaliar o domínio de {tema} por meio de atividades.",
-                f"Identificar lacunas no aprendizado sobre {tema}.",
-                "Promover a autoavaliação."
-            ],
-            'Introdução': lambda tema: [
-                f"Introduzir {tema} de forma envolvente.",
-                f"Despertar curiosidade sobre {tema}.",
-                f"Conectar {tema} ao cotidiano dos alunos."
-            ]
-        }
+    # Colunas da tabela do cronograma: (campo, largura)
+    COLUNAS_CRONOGRAMA = [
+        ('tempo', 6),
+        ('funcao', 23),
+        ('conteudo', 26),
+        ('ativ_professor', 26),
+        ('ativ_aluno', 26),
+        ('tecnica', 23),
+        ('meios', 23)
+    ]
+    ESCOLA = 'Escola Secundária'
+    TURMA = 'A'
+    AVALIACAO = ['Participação nas atividades', 'Compreensão do tema', 'Colaboração em grupo']
+    TAREFA_CASA = [ModeloTexto("Leitura complementar sobre {tema}"), ModeloTexto("Exercícios de fixação")]
 
-        self.conteudos_base = {
-            'História': lambda tema: [
-                f"Contexto histórico de {tema}.",
-                "Eventos e figuras principais.",
-                "Impactos e legados."
-            ],
-            'Geografia': lambda tema: [
-                f"Aspectos geográficos de {tema}.",
-                "Relações socioeconômicas.",
-                "Análise de mapas ou dados."
-            ],
-            'Português': lambda tema: [
-                f"Análise textual sobre {tema}.",
-                "Estruturas linguísticas.",
-                "Produção textual."
-            ],
-            'Matemática': lambda tema: [
-                f"Conceitos matemáticos de {tema}.",
-                "Resolução de problemas.",
-                "Aplicações práticas."
-            ]
-        }
+    # Funções didáticas do cronograma: (função, conteúdo, atividade do professor,
+    # atividade do aluno, índice da técnica de ensino, índice do meio de ensino)
+    FUNCOES_DIDATICAS = [
+        ('Introdução e Motivação', ModeloTexto("Apresentação de {tema}"),
+         ModeloTexto("Introduzir {tema} e contextualizar."), 'Participar da discussão inicial.', 0, 0),
+        ('Mediação e Assimilação', ModeloTexto("Exploração detalhada de {tema}"),
+         ModeloTexto("Explicar os conceitos principais de {tema}."), 'Anotar e fazer perguntas.', 1, 1),
+        ('Domínio e Consolidação', ModeloTexto("Aplicação prática de {tema}"),
+         ModeloTexto("Orientar atividades práticas sobre {tema}."), 'Realizar exercícios ou projetos.', 2, 2),
+        ('Controlo e Avaliação', ModeloTexto("Avaliação de {tema}"),
+         ModeloTexto("Avaliar o aprendizado sobre {tema}."), 'Responder a questões ou apresentar resultados.', 0, 3)
+    ]
+    TITULOS_CRONOGRAMA = ['Tempo', 'Função Didática', 'Conteúdo', 'Atividades (Professor)',
+                          'Atividades (Aluno)', 'Técnica de Ensino', 'Meios de Ensino']
+    BORDA_TABELA = "+" + "+".join("-" * (largura + 2) for _, largura in COLUNAS_CRONOGRAMA) + "+"
+    CABECALHO_TABELA = "| " + " | ".join(
+        titulo.ljust(largura) for titulo, (_, largura) in zip(TITULOS_CRONOGRAMA, COLUNAS_CRONOGRAMA)
+    ) + " |"
 
-        self.tecnicas_ensino = {
-            'Teórica': ['Exposição dialogada', 'Aula expositiva', 'Debate'],
-            'Prática/Experimental': ['Resolução de problemas', 'Atividade prática', 'Simulação'],
-            'Revisão': ['Revisão guiada', 'Exercícios de fixação', 'Discussão de dúvidas'],
-            'Avaliação': ['Prova escrita', 'Apresentação oral', 'Autoavaliação'],
-            'Introdução': ['Brainstorming', 'Estudo de caso', 'Vídeo introdutório']
-        }
+    def __init__(self, caminho_curriculo=None):
+        # Templates compilados por (disciplina, classe, foco, duracao): a tabela
+        # imutável preenchida por `aquecer` e os compilados a pedido
+        self._tabela = _TABELA_VAZIA
+        self._templates = {}
+        self._versao_templates = None
+        # Partes fixas do cronograma por (duracao, tecnicas)
+        self._esqueletos = {}
+
+        self.catalogo = CatalogoCurriculo(caminho_curriculo or CAMINHO_CURRICULO)
 
         self.meios_ensino = [
             'Quadro e marcador/giz',
@@ -104,52 +766,34 @@ class PlanoAulaGenerator:
             'Recursos digitais'
         ]
 
-    def gerar_cronograma(self, duracao, tema, foco):
-        """Gera o cronograma da aula em formato de tabela."""
-        if duracao == 90:
-            tempos = [10, 40, 30, 10]  # Proporcional para 90 minutos
-        else:
-            tempos = [5, 20, 15, 5]   # Padrão para 45 minutos
-
-        cronograma = [
-            {
-                'tempo': f"{tempos[0]}'",
-                'funcao': 'Introdução e Motivação',
-                'conteudo': f"Apresentação de {tema}",
-                'ativ_professor': f"Introduzir {tema} e contextualizar.",
-                'ativ_aluno': 'Participar da discussão inicial.',
-                'tecnica': self.tecnicas_ensino[foco][0],
-                'meios': self.meios_ensino[0]
-            },
-            {
-                'tempo': f"{tempos[1]}'",
-                'funcao': 'Mediação e Assimilação',
-                'conteudo': f"Exploração detalhada de {tema}",
-                'ativ_professor': f"Explicar os conceitos principais de {tema}.",
-                'ativ_aluno': 'Anotar e fazer perguntas.',
-                'tecnica': self.tecnicas_ensino[foco][1],
-                'meios': self.meios_ensino[1]
-            },
-            {
-                'tempo': f"{tempos[2]}'",
-                'funcao': 'Domínio e Consolidação',
-                'conteudo': f"Aplicação prática de {tema}",
-                'ativ_professor': f"Orientar atividades práticas sobre {tema}.",
-                'ativ_aluno': 'Realizar exercícios ou projetos.',
-                'tecnica': self.tecnicas_ensino[foco][2],
-                'meios': self.meios_ensino[2]
-            },
-            {
-                'tempo': f"{tempos[3]}'",
-                'funcao': 'Controlo e Avaliação',
-                'conteudo': f"Avaliação de {tema}",
-                'ativ_professor': f"Avaliar o aprendizado sobre {tema}.",
-                'ativ_aluno': 'Responder a questões ou apresentar resultados.',
-                'tecnica': self.tecnicas_ensino[foco][0],
-                'meios': self.meios_ensino[3]
-            }
+    def _esqueleto_cronograma(self, duracao, tecnicas):
+        """Linhas do cronograma com as partes fixas já montadas (e partilhadas).
+
+        Devolve tuplas (linha, modelo do conteúdo, modelo da atividade do
+        professor); só estes dois campos dependem do tema.
+        """
+        chave = (duracao, tecnicas)
+        esqueleto = self._esqueletos.get(chave)
+        if esqueleto is None:
+            tempos = repartir_duracao(duracao)
+            esqueleto = self._esqueletos[chave] = tuple(
+                (LinhaCronograma(sys.intern(f"{tempo}'"), funcao, None, None, ativ_aluno,
+                                 sys.intern(tecnicas[tecnica]), self.meios_ensino[meio]),
+                 conteudo, ativ_professor)
+                for tempo, (funcao, conteudo, ativ_professor, ativ_aluno, tecnica, meio)
+                in zip(tempos, self.FUNCOES_DIDATICAS)
+            )
+        return esqueleto
+
+    def gerar_cronograma(self, duracao, tema, foco, tecnicas=None):
+        """Gera o cronograma da aula (lista de LinhaCronograma)."""
+        if tecnicas is None:
+            tecnicas = self.catalogo.obter(None, None, foco).tecnicas
+        return [
+            LinhaCronograma(linha.tempo, linha.funcao, conteudo.formatar(tema), ativ_professor.formatar(tema),
+                            linha.ativ_aluno, linha.tecnica, linha.meios)
+            for linha, conteudo, ativ_professor in self._esqueleto_cronograma(duracao, tecnicas)
         ]
-        return cronograma
 
     def gerar_atividades(self, tema, foco):
         """Gera atividades com base no foco da aula."""
@@ -165,70 +809,1491 @@ class PlanoAulaGenerator:
             f"Análise de materiais relacionados a {tema}."
         ]
 
-    def criar_plano(self, tema, disciplina, classe, duracao, foco):
-        """Gera o plano de aula completo."""
-        try:
-            data = datetime.now().strftime("%d/%m/%Y")
-            objetivos = self.objetivos_base.get(foco, self.objetivos_base['Teórica'])(tema)
-            conteudo = self.conteudos_base.get(disciplina, lambda t: [f"Introdução a {t}.", "Conceitos básicos.", "Exemplos."])(tema)
-            cronograma = self.gerar_cronograma(duracao, tema, foco)
-            atividades = self.gerar_atividades(tema, foco)
-
-            # Formatar tabela do cronograma
-            tabela = [
-                "+--------+-------------------------+----------------------------+----------------------------+----------------------------+-------------------------+-------------------------+",
-                "| Tempo  | Função Didática         | Conteúdo                   | Atividades (Professor)     | Atividades (Aluno)         | Técnica de Ensino       | Meios de Ensino         |",
-                "+--------+-------------------------+----------------------------+----------------------------+----------------------------+-------------------------+-------------------------+"
-            ]
-            for linha in cronograma:
-                tabela.append(
-                    f"| {linha['tempo']:<6} | {linha['funcao']:<23} | {linha['conteudo']:<26} | {linha['ativ_professor']:<26} | {linha['ativ_aluno']:<26} | {linha['tecnica']:<23} | {linha['meios']:<23} |"
-                )
-            tabela.append("+--------+-------------------------+----------------------------+----------------------------+----------------------------+-------------------------+-------------------------+")
-            tabela_cronograma = "\n".join(tabela)
+    def _formatar_tabela(self, cronograma, celula=None):
+        """Formata o cronograma como tabela ASCII.
 
-            plano = f"""PLANO DE AULA
+        `celula(valor, largura)` permite substituir o preenchimento padrão
+        (usado pelo compilador de templates para marcar células variáveis).
+        """
+        if celula is None:
+            celula = str.ljust
+        tabela = [self.BORDA_TABELA, self.CABECALHO_TABELA, self.BORDA_TABELA]
+        for linha in cronograma:
+            tabela.append(
+                "| " + " | ".join(celula(getattr(linha, campo), largura) for campo, largura in self.COLUNAS_CRONOGRAMA) + " |"
+            )
+        tabela.append(self.BORDA_TABELA)
+        return "\n".join(tabela)
 
-Escola: Escola Secundária
+    def _montar_plano(self, data, duracao, disciplina, classe, tema, objetivos, conteudo, tabela_cronograma, atividades):
+        """Monta o texto final do plano a partir das partes já geradas."""
+        lista_objetivos = "\n".join(f"- {obj}" for obj in objetivos)
+        lista_conteudo = "\n".join(f"- {item}" for item in conteudo)
+        lista_meios = "\n".join(f"- {meio}" for meio in self.meios_ensino[:3])
+        lista_atividades = "\n".join(f"- {atividade}" for atividade in atividades)
+        lista_avaliacao = "\n".join(f"- {criterio}" for criterio in self.AVALIACAO)
+        lista_tarefa = "\n".join(f"- {modelo.formatar(tema)}" for modelo in self.TAREFA_CASA)
+        return f"""PLANO DE AULA
+
+Escola: {self.ESCOLA}
 Data: {data}
 Duração: {duracao} minutos
 Disciplina: {disciplina}
-Classe, Turma: {classe}, A
+Classe, Turma: {classe}, {self.TURMA}
 Unidade Temática: {tema}
 Tema: {tema}
 
 OBJETIVOS ESPECÍFICOS
-{'\n'.join(f'- {obj}' for obj in objetivos)}
+{lista_objetivos}
 
 CONTEÚDO
-{'\n'.join(f'- {item}' for item in conteudo)}
+{lista_conteudo}
 
 CRONOGRAMA
 {tabela_cronograma}
 
 RECURSOS DIDÁTICOS
-{'\n'.join(f'- {meio}' for meio in self.meios_ensino[:3])}
+{lista_meios}
 
 ATIVIDADES
-{'\n'.join(f'- {atividade}' for atividade in atividades)}
+{lista_atividades}
 
 AVALIAÇÃO
-- Participação nas atividades
-- Compreensão do tema
-- Colaboração em grupo
+{lista_avaliacao}
 
 TAREFA DE CASA
-- Leitura complementar sobre {tema}
-- Exercícios de fixação
+{lista_tarefa}
 """
-            return plano
+
+    def _partes_plano(self, tema, disciplina, classe, foco, duracao):
+        """Gera objetivos, conteúdo, cronograma e atividades para o tema."""
+        entrada = self.catalogo.obter(disciplina, classe, foco)
+        objetivos = [modelo.formatar(tema) for modelo in entrada.objetivos]
+        conteudo = [modelo.formatar(tema) for modelo in entrada.conteudos]
+        cronograma = self.gerar_cronograma(duracao, tema, foco, entrada.tecnicas)
+        atividades = self.gerar_atividades(tema, foco)
+        return objetivos, conteudo, cronograma, atividades
+
+    def estruturar_plano(self, tema, disciplina, classe, duracao, foco, data=None):
+        """Devolve o plano como dicionário (usado pelas exportações)."""
+        if data is None:
+            data = datetime.now().strftime("%d/%m/%Y")
+        objetivos, conteudo, cronograma, atividades = self._partes_plano(tema, disciplina, classe, foco, duracao)
+        return {
+            'escola': self.ESCOLA,
+            'data': data,
+            'duracao': duracao,
+            'disciplina': disciplina,
+            'classe': classe,
+            'turma': self.TURMA,
+            'unidade_tematica': tema,
+            'tema': tema,
+            'foco': foco,
+            'objetivos': objetivos,
+            'conteudo': conteudo,
+            'cronograma': [linha._asdict() for linha in cronograma],
+            'recursos': self.meios_ensino[:3],
+            'atividades': atividades,
+            'avaliacao': list(self.AVALIACAO),
+            'tarefa_casa': [modelo.formatar(tema) for modelo in self.TAREFA_CASA]
+        }
+
+    def criar_plano_direto(self, tema, disciplina, classe, duracao, foco):
+        """Gera o plano montando todo o texto a cada chamada (sem template).
+
+        Mantido como referência para o compilador de templates e para os benchmarks.
+        """
+        data = datetime.now().strftime("%d/%m/%Y")
+        objetivos, conteudo, cronograma, atividades = self._partes_plano(tema, disciplina, classe, foco, duracao)
+        tabela_cronograma = self._formatar_tabela(cronograma)
+        return self._montar_plano(data, duracao, disciplina, classe, tema, objetivos, conteudo, tabela_cronograma, atividades)
+
+    def compilar_template(self, disciplina, classe, foco, duracao):
+        """Compila o template do plano para (disciplina, classe, foco, duracao).
+
+        O plano é montado uma vez com marcadores no lugar do tema, da classe e
+        da data; as células da tabela que dependem do tema viram slots com
+        (prefixo, sufixo, largura) para que o preenchimento seja refeito.
+        """
+        objetivos, conteudo, cronograma, atividades = self._partes_plano(_SLOT_TEMA, disciplina, classe, foco, duracao)
+        celulas = []
+
+        def celula(valor, largura):
+            if _SLOT_TEMA in valor:
+                prefixo, sufixo = valor.split(_SLOT_TEMA, 1)
+                celulas.append((prefixo, sufixo, largura))
+                return _SLOT_CELULA
+            return valor.ljust(largura)
+
+        tabela_cronograma = self._formatar_tabela(cronograma, celula)
+        texto = self._montar_plano(_SLOT_DATA, duracao, disciplina, _SLOT_CLASSE, _SLOT_TEMA,
+                                   objetivos, conteudo, tabela_cronograma, atividades)
+        return PlanoTemplate(texto, celulas)
+
+    def obter_template(self, disciplina, classe, foco, duracao):
+        """Retorna o template compilado, compilando-o na primeira utilização.
+
+        Se o catálogo de currículo tiver sido recarregado, os templates
+        compilados com a versão anterior são descartados.
+        """
+        versao = self.catalogo.atualizar()
+        if versao != self._versao_templates:
+            self._tabela = _TABELA_VAZIA
+            self._templates = {}
+            self._versao_templates = versao
+        chave = (disciplina, classe, foco, duracao)
+        template = self._tabela.get(chave)
+        if template is None:
+            template = self._templates.get(chave)
+            if template is None:
+                # Inclui gerar_cronograma, gerar_atividades e a formatação da tabela
+                with cronometro('compilar_template'):
+                    template = self._templates[chave] = self.compilar_template(disciplina, classe, foco, duracao)
+        return template
+
+    def combinacoes(self):
+        """Todas as combinações (disciplina, classe, foco, duracao) válidas."""
+        return list(itertools.product(self.DISCIPLINAS, self.CLASSES, self.FOCOS, self.DURACOES))
+
+    def aquecer(self):
+        """Pré-compila os templates de todas as combinações numa tabela imutável.
+
+        Chamado antes do fork dos workers do servidor (p. ex. `gunicorn
+        --preload`), a tabela é partilhada entre eles em copy-on-write.
+        Devolve o número de templates na tabela.
+        """
+        versao = self.catalogo.atualizar()
+        repartir_duracoes(self.DURACOES)
+        combinacoes = self.combinacoes()
+        tabela = {chave: self.compilar_template(*chave) for chave in combinacoes}
+        # Esqueletos do cronograma, usados pelo plano estruturado (como_dict)
+        for disciplina, classe, foco, duracao in combinacoes:
+            self._esqueleto_cronograma(duracao, self.catalogo.obter(disciplina, classe, foco).tecnicas)
+        if self.catalogo.atualizar() != versao:
+            # O catálogo mudou durante o aquecimento: a tabela já não é válida
+            return 0
+        self._tabela = MappingProxyType(tabela)
+        self._templates = {}
+        self._versao_templates = versao
+        return len(tabela)
+
+    def validar(self, tema, disciplina, classe, duracao, foco):
+        """Valida os campos de um plano e devolve-os normalizados.
+
+        Levanta ValueError com a mensagem a apresentar ao usuário.
+        """
+        tema, disciplina, classe, foco = (str(v).strip() for v in (tema, disciplina, classe, foco))
+        duracao = str(duracao).strip()
+        if not all([tema, disciplina, classe, duracao, foco]):
+            raise ValueError('Todos os campos são obrigatórios')
+        try:
+            duracao = int(duracao)
+        except ValueError:
+            duracao = None
+        if duracao not in self.DURACOES:
+            raise ValueError(f"Duração deve ser de {', '.join(map(str, self.DURACOES))} minutos")
+        if disciplina not in self.DISCIPLINAS or classe not in self.CLASSES or foco not in self.FOCOS:
+            raise ValueError('Valores inválidos selecionados')
+        return tema, disciplina, classe, duracao, foco
+
+    def criar_plano(self, tema, disciplina, classe, duracao, foco, data=None):
+        """Gera o plano de aula (PlanoAula; o texto é formatado só quando pedido)."""
+        try:
+            if data is None:
+                data = datetime.now().strftime("%d/%m/%Y")
+            template = self.obter_template(disciplina, classe, foco, duracao)
+            return PlanoAula(self, template, tema, disciplina, classe, duracao, foco, data)
         except Exception as e:
-            logger.error(f"Erro ao criar plano: {str(e)}")
+            logger.error("Erro ao criar plano: %s", e)
             raise
 
+    def iterar_planos(self, especificacoes, data=None):
+        """Gera o texto de vários planos de forma preguiçosa, um de cada vez.
+
+        `especificacoes` é um iterável de tuplas (tema, disciplina, classe,
+        duracao, foco). A data é calculada uma só vez e cada template é obtido
+        uma só vez por grupo (disciplina, classe, foco, duracao) do lote.
+        """
+        if data is None:
+            data = datetime.now().strftime("%d/%m/%Y")
+        templates = {}
+        for tema, disciplina, classe, duracao, foco in especificacoes:
+            chave = (disciplina, classe, foco, duracao)
+            template = templates.get(chave)
+            if template is None:
+                template = templates[chave] = self.obter_template(disciplina, classe, foco, duracao)
+            yield template.render(tema, classe, data)
+
+    def criar_planos(self, especificacoes, data=None):
+        """Gera vários planos de uma vez (ver `iterar_planos`)."""
+        return list(self.iterar_planos(especificacoes, data))
+
+# Gerador próprio de cada processo do pool (ver GeradorParalelo)
+_generator_worker = None
+
+def _iniciar_worker():
+    """Inicializa o processo do pool com um gerador já aquecido."""
+    global _generator_worker
+    _generator_worker = PlanoAulaGenerator()
+    _generator_worker.aquecer()
+
+def _gerar_bloco(especificacoes, data):
+    """Gera um bloco de planos dentro de um processo do pool."""
+    return _generator_worker.criar_planos(especificacoes, data)
+
+class PoolProcessos:
+    """ProcessPoolExecutor criado só no primeiro uso.
+
+    Os processos saem do forkserver e não de um fork do processo atual:
+    quando o pool é criado, já dentro de um pedido, há threads a correr
+    (logging, KDF, servidor) e o filho herdaria os locks que estivessem
+    presos por elas.
+    """
+
+    def __init__(self, workers, initializer=None):
+        self.workers = workers
+        self.initializer = initializer
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def obter(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=self.initializer,
+                    mp_context=multiprocessing.get_context('forkserver'))
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+class GeradorParalelo:
+    """Geração de planos em lote distribuída por vários processos.
+
+    As especificações são enviadas em blocos para reduzir o custo de
+    serialização; os resultados são devolvidos na ordem de entrada e no
+    máximo `2 * workers` blocos ficam em processamento ao mesmo tempo.
+    """
+
+    def __init__(self, workers=None, tamanho_bloco=256):
+        self.workers = workers or os.cpu_count() or 1
+        self.tamanho_bloco = tamanho_bloco
+        self._pool = PoolProcessos(self.workers, initializer=_iniciar_worker)
+
+    def iterar_planos(self, especificacoes, data=None):
+        """Gera os planos em paralelo, devolvendo-os na ordem de entrada."""
+        if data is None:
+            data = datetime.now().strftime("%d/%m/%Y")
+        executor = self._pool.obter()
+        especificacoes = list(especificacoes)
+        pendentes = deque()
+        for inicio in range(0, len(especificacoes), self.tamanho_bloco):
+            bloco = especificacoes[inicio:inicio + self.tamanho_bloco]
+            pendentes.append(executor.submit(_gerar_bloco, bloco, data))
+            if len(pendentes) >= 2 * self.workers:
+                yield from pendentes.popleft().result()
+        while pendentes:
+            yield from pendentes.popleft().result()
+
+    def criar_planos(self, especificacoes, data=None):
+        """Gera vários planos em paralelo (ver `iterar_planos`)."""
+        return list(self.iterar_planos(especificacoes, data))
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+class ExportadorPlanos:
+    """Renderização dos planos para download em PDF e DOCX.
+
+    Os arquivos são renderizados num pool de processos, para não ocupar as
+    threads que atendem /gerar; com `workers=0` são renderizados na própria
+    thread do pedido.
+    """
+
+    def __init__(self, workers=2, timeout=30):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = PoolProcessos(workers)
+
+    def renderizar(self, formato, plano):
+        """Devolve os bytes do plano estruturado no formato pedido."""
+        if self.workers <= 0:
+            return exportacao.renderizar(formato, plano)
+        return self._pool.obter().submit(exportacao.renderizar, formato, plano).result(self.timeout)
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+class CachePlanos:
+    """Cache LRU de planos gerados, limitado em número de entradas e em bytes.
+
+    A chave inclui a data do plano; quando a data muda, as entradas do dia
+    anterior são descartadas de uma vez (expiram à meia-noite).
+    """
+
+    def __init__(self, max_planos=1024, max_bytes=16 * 1024 * 1024):
+        self.max_planos = max_planos
+        self.max_bytes = max_bytes
+        self._planos = OrderedDict()
+        self._bytes = 0
+        self._data = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirados = 0
+
+    def _expirar(self, data):
+        """Descarta as entradas de outras datas."""
+        if data != self._data:
+            self.expirados += len(self._planos)
+            self._planos.clear()
+            self._bytes = 0
+            self._data = data
+
+    def get(self, chave, data):
+        with self._lock:
+            self._expirar(data)
+            entrada = self._planos.get(chave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            self._planos.move_to_end(chave)
+            self.hits += 1
+            return entrada[0]
+
+    def put(self, chave, data, plano):
+        # O tamanho é medido uma só vez, na inserção, e guardado com o plano
+        tamanho = sys.getsizeof(plano)
+        if tamanho > self.max_bytes:
+            return
+        with self._lock:
+            self._expirar(data)
+            anterior = self._planos.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= anterior[1]
+            self._planos[chave] = (plano, tamanho)
+            self._bytes += tamanho
+            while len(self._planos) > self.max_planos or self._bytes > self.max_bytes:
+                _, (_, removido) = self._planos.popitem(last=False)
+                self._bytes -= removido
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._planos.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        """Contadores do cache, para dimensionamento."""
+        with self._lock:
+            return {
+                'entradas': len(self._planos),
+                'bytes': self._bytes,
+                'max_planos': self.max_planos,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirados': self.expirados
+            }
+
+class PoolConexoes:
+    """Pool de conexões SQLite partilhado entre as threads do processo."""
+
+    def __init__(self, caminho, tamanho=8):
+        self.caminho = caminho
+        self.tamanho = tamanho
+        self._livres = queue.LifoQueue(maxsize=tamanho)
+        os.register_at_fork(after_in_child=self.reiniciar_apos_fork)
+
+    def reiniciar_apos_fork(self):
+        """Uma conexão SQLite não pode passar para o processo filho (p. ex.
+        gunicorn --preload): o filho abandona as herdadas, sem as fechar, e
+        abre as suas."""
+        self._livres = queue.LifoQueue(maxsize=self.tamanho)
+
+    def _abrir(self):
+        conexao = sqlite3.connect(self.caminho, timeout=10, check_same_thread=False)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=NORMAL")
+        return conexao
+
+    @contextmanager
+    def conexao(self):
+        """Empresta uma conexão; a transação é confirmada (ou revertida) à saída."""
+        try:
+            conexao = self._livres.get_nowait()
+        except queue.Empty:
+            conexao = self._abrir()
+        try:
+            with conexao:
+                yield conexao
+        finally:
+            try:
+                self._livres.put_nowait(conexao)
+            except queue.Full:
+                conexao.close()
+
+# Palavras ignoradas na pesquisa (já sem acentos)
+PALAVRAS_VAZIAS = frozenset(
+    'a o as os e de da das do dos em no na nos nas num numa um uma uns umas ao aos '
+    'para pela pelas pelo pelos por com sem sobre entre que se ou'.split()
+)
+# Plurais (já sem acentos) e a sua forma no singular, como no passo de
+# redução de plural do RSLP; o primeiro sufixo que corresponder é usado
+SUFIXOS_PLURAL = (('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'), ('ois', 'ol'),
+                  ('ns', 'm'), ('res', 'r'), ('s', ''))
+_RE_PALAVRAS = re.compile(r'\w+')
+
+def sem_acentos(texto):
+    """Texto em minúsculas e sem acentos (fotossíntese -> fotossintese)."""
+    decomposto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+@lru_cache(maxsize=65536)
+def radical(palavra):
+    """Reduz a palavra (sem acentos) ao singular: células -> celula, revoluções -> revolucao."""
+    if len(palavra) > 3:
+        for sufixo, troca in SUFIXOS_PLURAL:
+            if palavra.endswith(sufixo):
+                return palavra[:-len(sufixo)] + troca
+    return palavra
+
+def normalizar_termos(texto):
+    """Termos de pesquisa de um texto: sem acentos, sem palavras vazias e no singular."""
+    return [radical(palavra) for palavra in _RE_PALAVRAS.findall(sem_acentos(texto))
+            if palavra not in PALAVRAS_VAZIAS]
+
+def etiqueta_filtro(campo, valor):
+    """Termo artificial que marca o valor de um filtro (p. ex. _c_10a_classe)."""
+    return f"_{campo}_" + '_'.join(_RE_PALAVRAS.findall(sem_acentos(valor)))
+
+class IndicePesquisa:
+    """Índice invertido (SQLite FTS5) sobre o tema, objetivos, conteúdo e
+    atividades dos planos guardados.
+
+    Os termos são normalizados em Python (`normalizar_termos`), por isso a
+    pesquisa ignora acentos e plurais. A disciplina, a classe e o foco são
+    indexados como termos artificiais (`etiqueta_filtro`), de modo que os
+    filtros são resolvidos pelo próprio índice. A tabela não guarda o texto
+    (content='') nem posições (detail=none); o rowid é o id do plano.
+    """
+
+    ESQUEMA = [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS pesquisa USING fts5(
+            termos, content='', detail=none, tokenize="unicode61 tokenchars '_'"
+        )"""
+    ]
+
+    def __init__(self, pool):
+        self.pool = pool
+        with pool.conexao() as conexao:
+            for comando in self.ESQUEMA:
+                conexao.execute(comando)
+
+    @staticmethod
+    def termos_plano(tema, disciplina, classe, foco, plano):
+        """Termos indexados de um plano (PlanoAula, dicionário estruturado ou texto)."""
+        if isinstance(plano, PlanoAula):
+            plano = plano.como_dict()
+        if isinstance(plano, dict):
+            textos = [tema, *plano['objetivos'], *plano['conteudo'], *plano['atividades']]
+        else:
+            textos = [tema, str(plano)]
+        termos = [etiqueta_filtro('d', disciplina), etiqueta_filtro('c', classe), etiqueta_filtro('f', foco)]
+        for texto in textos:
+            termos.extend(normalizar_termos(texto))
+        return ' '.join(termos)
+
+    def indexar(self, conexao, plano_id, termos):
+        """Acrescenta um plano ao índice, na transação de `conexao`.
+
+        `termos` vem de `termos_plano`, calculado antes: a normalização não
+        deve correr com a base bloqueada para escrita.
+        """
+        conexao.execute("INSERT INTO pesquisa (rowid, termos) VALUES (?, ?)", (plano_id, termos))
+
+    def limpar(self, conexao):
+        conexao.execute("INSERT INTO pesquisa (pesquisa) VALUES ('delete-all')")
+
+    def pesquisar(self, consulta, disciplina=None, classes=(), foco=None, limite=20, deslocamento=0):
+        """Ids dos planos com todos os termos da consulta, do mais recente ao mais antigo.
+
+        `classes` aceita várias classes (qualquer uma serve).
+        """
+        termos = [f'"{termo}"' for termo in dict.fromkeys(normalizar_termos(consulta))]
+        if not termos:
+            return []
+        if disciplina:
+            termos.append(f'"{etiqueta_filtro("d", disciplina)}"')
+        if classes:
+            termos.append('(' + ' OR '.join(f'"{etiqueta_filtro("c", classe)}"' for classe in classes) + ')')
+        if foco:
+            termos.append(f'"{etiqueta_filtro("f", foco)}"')
+        with self.pool.conexao() as conexao:
+            linhas = conexao.execute(
+                "SELECT rowid FROM pesquisa WHERE pesquisa MATCH ? ORDER BY rowid DESC LIMIT ? OFFSET ?",
+                (' AND '.join(termos), limite, deslocamento)
+            ).fetchall()
+        return [linha[0] for linha in linhas]
+
+def codificar_delta(base, texto):
+    """Comprime `texto` com zlib usando `base` como dicionário inicial.
+
+    As partes iguais à base (bordas da tabela, avaliação, tarefa de casa,
+    e as linhas em que só o tema muda) viram referências curtas, por isso o
+    resultado é um delta em relação à base.
+    """
+    compressor = zlib.compressobj(9, zdict=base.encode('utf-8'))
+    return compressor.compress(texto.encode('utf-8')) + compressor.flush()
+
+def aplicar_delta(base, delta):
+    """Reconstrói o texto a partir da base e de um delta de `codificar_delta`."""
+    descompressor = zlib.decompressobj(zdict=base.encode('utf-8'))
+    return (descompressor.decompress(delta) + descompressor.flush()).decode('utf-8')
+
+class ArmazemPlanos:
+    """Armazenamento persistente dos planos gerados (SQLite).
+
+    Os planos de um usuário para a mesma disciplina e classe formam um
+    histórico de revisões: cada plano novo é guardado como delta em relação
+    ao anterior, indicado em `base` (ver `codificar_delta`); a cada
+    `max_cadeia` revisões, ou quando o delta não compensa, o texto é
+    guardado inteiro. Os índices em (usuario, data) e (disciplina, classe,
+    tema) servem as consultas "os meus planos desta semana" e "todos os
+    planos de uma turma". Com um IndicePesquisa, cada plano novo é indexado
+    na mesma transação em que é gravado.
+    """
+
+    ESQUEMA = [
+        """CREATE TABLE IF NOT EXISTS planos (
+            id INTEGER PRIMARY KEY,
+            usuario TEXT NOT NULL,
+            tema TEXT NOT NULL,
+            disciplina TEXT NOT NULL,
+            classe TEXT NOT NULL,
+            duracao INTEGER NOT NULL,
+            foco TEXT NOT NULL,
+            data TEXT NOT NULL,
+            plano BLOB NOT NULL,
+            base INTEGER,
+            tamanho INTEGER
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_planos_usuario_data ON planos (usuario, data)",
+        "CREATE INDEX IF NOT EXISTS idx_planos_turma ON planos (disciplina, classe, tema)",
+        "CREATE INDEX IF NOT EXISTS idx_planos_historico ON planos (usuario, disciplina, classe, id)",
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_planos_unico
+            ON planos (usuario, data, tema, disciplina, classe, duracao, foco)"""
+    ]
+    # Colunas acrescentadas depois da primeira versão do esquema
+    COLUNAS_NOVAS = [('base', 'INTEGER'), ('tamanho', 'INTEGER')]
+    CAMPOS = ('id', 'usuario', 'tema', 'disciplina', 'classe', 'duracao', 'foco', 'data')
+
+    def __init__(self, pool, max_cadeia=16, cache_max=1024, indice=None):
+        self.pool = pool
+        self.indice = indice
+        self.max_cadeia = max_cadeia
+        self.cache_max = cache_max
+        # Última revisão conhecida de cada histórico: (usuario, disciplina, classe) -> (id, texto, profundidade)
+        self._ultimas = OrderedDict()
+        self._lock = threading.Lock()
+        with pool.conexao() as conexao:
+            colunas = {linha[1] for linha in conexao.execute("PRAGMA table_info(planos)")}
+            for coluna, tipo in self.COLUNAS_NOVAS:
+                if colunas and coluna not in colunas:
+                    conexao.execute(f"ALTER TABLE planos ADD COLUMN {coluna} {tipo}")
+            for comando in self.ESQUEMA:
+                conexao.execute(comando)
+
+    def _reconstruir(self, conexao, plano_id):
+        """Devolve (texto, profundidade) de uma revisão, ou None.
+
+        A cadeia até ao texto inteiro mais próximo é lida numa só consulta.
+        """
+        cadeia = conexao.execute(
+            """WITH RECURSIVE cadeia(id, base, plano) AS (
+                   SELECT id, base, plano FROM planos WHERE id = ?
+                   UNION ALL
+                   SELECT p.id, p.base, p.plano FROM planos p JOIN cadeia c ON p.id = c.base
+               )
+               SELECT base, plano FROM cadeia""",
+            (plano_id,)
+        ).fetchall()
+        if not cadeia:
+            return None
+        texto = zlib.decompress(cadeia[-1][1]).decode('utf-8')
+        for _, delta in reversed(cadeia[:-1]):
+            texto = aplicar_delta(texto, delta)
+        return texto, len(cadeia) - 1
+
+    def _ultima_revisao(self, conexao, historico):
+        """(id, texto, profundidade) da revisão mais recente do histórico, ou None."""
+        with self._lock:
+            ultima = self._ultimas.get(historico)
+        if ultima is not None:
+            return ultima
+        linha = conexao.execute(
+            "SELECT id FROM planos WHERE usuario = ? AND disciplina = ? AND classe = ? ORDER BY id DESC LIMIT 1",
+            historico
+        ).fetchone()
+        if linha is None:
+            return None
+        return (linha[0],) + self._reconstruir(conexao, linha[0])
+
+    def _lembrar(self, historico, plano_id, texto, profundidade):
+        with self._lock:
+            self._ultimas[historico] = (plano_id, texto, profundidade)
+            self._ultimas.move_to_end(historico)
+            while len(self._ultimas) > self.cache_max:
+                self._ultimas.popitem(last=False)
+
+    def salvar(self, usuario, tema, disciplina, classe, duracao, foco, plano, data=None):
+        """Grava o plano e devolve o seu id (o mesmo plano no mesmo dia não é duplicado).
+
+        `plano` é o texto ou um PlanoAula; é guardado o texto formatado, como
+        delta em relação à revisão anterior do mesmo histórico.
+        """
+        data = (data or date.today()).isoformat()
+        chave = (usuario, data, tema, disciplina, classe, duracao, foco)
+        consulta_id = """SELECT id FROM planos WHERE usuario = ? AND data = ? AND tema = ? AND disciplina = ?
+                         AND classe = ? AND duracao = ? AND foco = ?"""
+        historico = (usuario, disciplina, classe)
+        with self.pool.conexao() as conexao:
+            linha = conexao.execute(consulta_id, chave).fetchone()
+            if linha is not None:
+                return linha[0]
+
+            texto = str(plano)
+            conteudo = zlib.compress(texto.encode('utf-8'))
+            base, profundidade = None, 0
+            ultima = self._ultima_revisao(conexao, historico)
+            if ultima is not None and ultima[2] < self.max_cadeia:
+                delta = codificar_delta(ultima[1], texto)
+                if len(delta) < len(conteudo):
+                    conteudo, base, profundidade = delta, ultima[0], ultima[2] + 1
+            # Antes do INSERT, que bloqueia a base para escrita até ao fim da transação
+            if self.indice is not None:
+                termos = self.indice.termos_plano(tema, disciplina, classe, foco, plano)
+
+            cursor = conexao.execute(
+                """INSERT OR IGNORE INTO planos (usuario, data, tema, disciplina, classe, duracao, foco, plano, base, tamanho)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                chave + (conteudo, base, len(texto.encode('utf-8')))
+            )
+            if not cursor.rowcount:
+                # Gravado ao mesmo tempo por outro pedido
+                return conexao.execute(consulta_id, chave).fetchone()[0]
+            if self.indice is not None:
+                self.indice.indexar(conexao, cursor.lastrowid, termos)
+        self._lembrar(historico, cursor.lastrowid, texto, profundidade)
+        return cursor.lastrowid
+
+    def obter(self, plano_id, usuario=None):
+        """Devolve o plano com o texto reconstruído, ou None (também se
+        `usuario` for indicado e o plano for de outro usuário)."""
+        with self.pool.conexao() as conexao:
+            linha = conexao.execute(
+                f"SELECT {', '.join(self.CAMPOS)} FROM planos WHERE id = ? AND (?2 IS NULL OR usuario = ?2)",
+                (plano_id, usuario)
+            ).fetchone()
+            if linha is None:
+                return None
+            registro = dict(zip(self.CAMPOS, linha))
+            registro['plano'] = self._reconstruir(conexao, plano_id)[0]
+        return registro
+
+    def listar_ids(self, ids):
+        """Planos (sem o texto) com os ids indicados, pela mesma ordem."""
+        if not ids:
+            return []
+        with self.pool.conexao() as conexao:
+            linhas = conexao.execute(
+                f"SELECT {', '.join(self.CAMPOS)} FROM planos WHERE id IN ({', '.join('?' * len(ids))})", ids
+            ).fetchall()
+        por_id = {linha[0]: dict(zip(self.CAMPOS, linha)) for linha in linhas}
+        return [por_id[plano_id] for plano_id in ids if plano_id in por_id]
+
+    def historico(self, usuario, disciplina, classe, limite=100, deslocamento=0):
+        """Revisões de um usuário para uma disciplina e classe, da mais recente à mais antiga.
+
+        Cada revisão traz a `base` (None se guardada inteira), o tamanho do
+        texto e os bytes efetivamente guardados.
+        """
+        with self.pool.conexao() as conexao:
+            linhas = conexao.execute(
+                f"""SELECT {', '.join(self.CAMPOS)}, base, tamanho, length(plano) FROM planos
+                    WHERE usuario = ? AND disciplina = ? AND classe = ?
+                    ORDER BY id DESC LIMIT ? OFFSET ?""",
+                (usuario, disciplina, classe, limite, deslocamento)
+            ).fetchall()
+        return [dict(zip(self.CAMPOS + ('base', 'tamanho', 'armazenado'), linha)) for linha in linhas]
+
+    def estatisticas(self, usuario=None):
+        """Espaço ocupado pelos textos dos planos e espaço poupado pelos deltas.
+
+        Planos gravados antes do histórico de revisões (sem `tamanho`) não
+        entram nas contas.
+        """
+        condicao, parametros = ("AND usuario = ?", (usuario,)) if usuario is not None else ("", ())
+        with self.pool.conexao() as conexao:
+            planos, deltas, texto, armazenado = conexao.execute(
+                f"""SELECT COUNT(*), COUNT(base), COALESCE(SUM(tamanho), 0), COALESCE(SUM(length(plano)), 0)
+                    FROM planos WHERE tamanho IS NOT NULL {condicao}""",
+                parametros
+            ).fetchone()
+        return {
+            'planos': planos,
+            'deltas': deltas,
+            'bytes_texto': texto,
+            'bytes_armazenados': armazenado,
+            'bytes_poupados': texto - armazenado,
+            'razao_compressao': texto / armazenado if armazenado else None
+        }
+
+    def _listar(self, condicoes, parametros, limite, deslocamento):
+        consulta = (f"SELECT {', '.join(self.CAMPOS)} FROM planos WHERE {' AND '.join(condicoes)}"
+                    " ORDER BY data DESC, id DESC LIMIT ? OFFSET ?")
+        with self.pool.conexao() as conexao:
+            linhas = conexao.execute(consulta, parametros + [limite, deslocamento]).fetchall()
+        return [dict(zip(self.CAMPOS, linha)) for linha in linhas]
+
+    def listar_por_usuario(self, usuario, desde=None, ate=None, limite=100, deslocamento=0):
+        """Planos de um usuário, opcionalmente entre duas datas (inclusive)."""
+        condicoes, parametros = ["usuario = ?"], [usuario]
+        if desde is not None:
+            condicoes.append("data >= ?")
+            parametros.append(desde.isoformat())
+        if ate is not None:
+            condicoes.append("data <= ?")
+            parametros.append(ate.isoformat())
+        return self._listar(condicoes, parametros, limite, deslocamento)
+
+    def listar_por_turma(self, disciplina, classe, tema=None, limite=100, deslocamento=0):
+        """Planos de todos os usuários para uma disciplina e classe (e tema)."""
+        condicoes, parametros = ["disciplina = ?", "classe = ?"], [disciplina, classe]
+        if tema:
+            condicoes.append("tema = ?")
+            parametros.append(tema)
+        return self._listar(condicoes, parametros, limite, deslocamento)
+
+class SobrecargaAutenticacao(Exception):
+    """Há demasiadas verificações de senha em espera."""
+
+class ArmazemUsuarios:
+    """Credenciais dos usuários em SQLite, com senhas derivadas por scrypt.
+
+    O scrypt é deliberadamente lento, por isso corre num pool de threads
+    limitado; quando há mais de `max_pendentes` verificações em espera é
+    levantada SobrecargaAutenticacao. Credenciais verificadas recentemente
+    ficam num pequeno cache (chaveado por HMAC, sem guardar a senha) para
+    que pedidos repetidos não voltem a executar o KDF.
+    """
+
+    ESQUEMA = [
+        """CREATE TABLE IF NOT EXISTS usuarios (
+            username TEXT PRIMARY KEY,
+            senha TEXT NOT NULL,
+            criado_em TEXT NOT NULL
+        )"""
+    ]
+    # Parâmetros do scrypt: n=2^14, r=8, p=1 (cerca de 16 MiB e dezenas de ms por senha)
+    SCRYPT_N = 2 ** 14
+    SCRYPT_R = 8
+    SCRYPT_P = 1
+
+    def __init__(self, pool, workers=2, max_pendentes=32, cache_ttl=300, cache_max=1024):
+        self.pool = pool
+        self.workers = workers
+        self.max_pendentes = max_pendentes
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kdf')
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+        self._segredo_cache = os.urandom(32)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        os.register_at_fork(after_in_child=self.reiniciar_apos_fork)
+        self.cache_ttl = cache_ttl
+        self.cache_max = cache_max
+        # Hash usado quando o usuário não existe, para não revelar a sua ausência pelo tempo de resposta
+        self._hash_falso = self._derivar('')
+        with pool.conexao() as conexao:
+            for comando in self.ESQUEMA:
+                conexao.execute(comando)
+
+    def reiniciar_apos_fork(self):
+        """Os threads do pool do KDF não sobrevivem ao fork (p. ex. gunicorn
+        --preload), e os locks podem ter ficado presos por eles."""
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='kdf')
+        self._vagas = threading.BoundedSemaphore(self.max_pendentes)
+        self._cache_lock = threading.Lock()
+
+    def _derivar(self, senha, sal=None):
+        sal = sal or os.urandom(16)
+        chave = hashlib.scrypt(senha.encode('utf-8'), salt=sal, n=self.SCRYPT_N, r=self.SCRYPT_R,
+                               p=self.SCRYPT_P, maxmem=64 * 1024 * 1024)
+        return f"scrypt${self.SCRYPT_N}${self.SCRYPT_R}${self.SCRYPT_P}${sal.hex()}${chave.hex()}"
+
+    @staticmethod
+    def _confere(senha, guardado):
+        _, n, r, p, sal, chave = guardado.split('$')
+        calculada = hashlib.scrypt(senha.encode('utf-8'), salt=bytes.fromhex(sal), n=int(n), r=int(r),
+                                   p=int(p), maxmem=64 * 1024 * 1024)
+        return hmac.compare_digest(calculada, bytes.fromhex(chave))
+
+    def _executar_kdf(self, funcao, *args):
+        """Executa o KDF no pool limitado, recusando se a fila estiver cheia."""
+        if not self._vagas.acquire(blocking=False):
+            raise SobrecargaAutenticacao()
+        try:
+            return self._executor.submit(funcao, *args).result()
+        finally:
+            self._vagas.release()
+
+    def _chave_cache(self, username, senha):
+        return hmac.new(self._segredo_cache, f"{username}\0{senha}".encode('utf-8'), hashlib.sha256).digest()
+
+    def _buscar_hash(self, username):
+        with self.pool.conexao() as conexao:
+            linha = conexao.execute("SELECT senha FROM usuarios WHERE username = ?", (username,)).fetchone()
+        return linha[0] if linha else None
+
+    def existe(self, username):
+        return self._buscar_hash(username) is not None
+
+    def criar(self, username, senha):
+        """Cria o usuário; devolve False se já existir."""
+        guardado = self._executar_kdf(self._derivar, senha)
+        try:
+            with self.pool.conexao() as conexao:
+                conexao.execute("INSERT INTO usuarios (username, senha, criado_em) VALUES (?, ?, ?)",
+                                (username, guardado, datetime.now().isoformat(timespec='seconds')))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def semear(self, usuarios):
+        """Cria os usuários indicados que ainda não existam."""
+        for username, senha in usuarios.items():
+            if not self.existe(username):
+                self.criar(username, senha)
+
+    def verificar(self, username, senha):
+        """Confere a senha do usuário."""
+        chave = self._chave_cache(username, senha)
+        agora = time.monotonic()
+        with self._cache_lock:
+            expira = self._cache.get(chave)
+            if expira is not None:
+                if expira > agora:
+                    self._cache.move_to_end(chave)
+                    return True
+                del self._cache[chave]
+
+        guardado = self._buscar_hash(username)
+        valido = self._executar_kdf(self._confere, senha, guardado or self._hash_falso)
+        if not (valido and guardado):
+            return False
+
+        with self._cache_lock:
+            self._cache[chave] = agora + self.cache_ttl
+            while len(self._cache) > self.cache_max:
+                self._cache.popitem(last=False)
+        return True
+
+class SessaoServidor(CallbackDict, SessionMixin):
+    """Sessão do Flask guardada no servidor; o cookie leva só o id."""
+
+    def __init__(self, dados=None, sid=None, expira=None):
+        def ao_alterar(sessao):
+            sessao.modified = True
+        super().__init__(dados, ao_alterar)
+        self.sid = sid
+        self.sid_anterior = None
+        self.expira = expira
+        self.modified = False
+
+    def regenerar(self):
+        """Troca o id da sessão na próxima gravação (p. ex. no login)."""
+        if self.sid is not None:
+            self.sid_anterior = self.sid
+            self.sid = None
+        self.modified = True
+
+class ArmazemSessoesMemoria:
+    """Sessões num dicionário do próprio processo.
+
+    Serve para testes e para um único worker; com vários workers deve ser
+    usado ArmazemSessoes.
+    """
+
+    def __init__(self):
+        self._sessoes = {}
+        self._lock = threading.Lock()
+
+    def obter(self, sid):
+        """Devolve (dados serializados, expira) ou None."""
+        with self._lock:
+            return self._sessoes.get(sid)
+
+    def gravar(self, sid, dados, expira):
+        with self._lock:
+            self._sessoes[sid] = (dados, expira)
+
+    def apagar(self, sid):
+        with self._lock:
+            self._sessoes.pop(sid, None)
+
+    def expirar(self, agora):
+        """Apaga as sessões expiradas e devolve quantas foram apagadas."""
+        with self._lock:
+            expiradas = [sid for sid, (_, expira) in self._sessoes.items() if expira <= agora]
+            for sid in expiradas:
+                del self._sessoes[sid]
+        return len(expiradas)
+
+class ArmazemSessoes:
+    """Sessões em SQLite, partilhadas por todos os workers (mesma interface
+    que ArmazemSessoesMemoria)."""
+
+    ESQUEMA = [
+        """CREATE TABLE IF NOT EXISTS sessoes (
+            id TEXT PRIMARY KEY,
+            dados TEXT NOT NULL,
+            expira REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_sessoes_expira ON sessoes (expira)"
+    ]
+
+    def __init__(self, pool):
+        self.pool = pool
+        with pool.conexao() as conexao:
+            for comando in self.ESQUEMA:
+                conexao.execute(comando)
+
+    def obter(self, sid):
+        with self.pool.conexao() as conexao:
+            return conexao.execute("SELECT dados, expira FROM sessoes WHERE id = ?", (sid,)).fetchone()
+
+    def gravar(self, sid, dados, expira):
+        with self.pool.conexao() as conexao:
+            conexao.execute("INSERT OR REPLACE INTO sessoes (id, dados, expira) VALUES (?, ?, ?)",
+                            (sid, dados, expira))
+
+    def apagar(self, sid):
+        with self.pool.conexao() as conexao:
+            conexao.execute("DELETE FROM sessoes WHERE id = ?", (sid,))
+
+    def expirar(self, agora):
+        with self.pool.conexao() as conexao:
+            return conexao.execute("DELETE FROM sessoes WHERE expira <= ?", (agora,)).rowcount
+
+class InterfaceSessoesServidor(SessionInterface):
+    """Sessões do Flask guardadas num armazém do servidor.
+
+    O cookie leva só um id aleatório de 128 bits, sem assinatura: não há
+    conteúdo a proteger, por isso ler a sessão não exige HMAC. Cada worker
+    guarda as sessões lidas num cache LRU válido por `ttl_cache` segundos
+    (um logout noutro worker é visto ao fim desse tempo), e as sessões
+    expiradas são apagadas de uma vez, no máximo a cada `intervalo_limpeza`
+    segundos. A validade da sessão é `PERMANENT_SESSION_LIFETIME`, renovada
+    quando passa a metade; uma sessão sem usuário (p. ex. só com a mensagem
+    flash que leva ao login) vale apenas `validade_anonima` segundos, para
+    que o tráfego anónimo não encha a tabela.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, armazem, ttl_cache=5, max_cache=10000, intervalo_limpeza=300, validade_anonima=300):
+        self.armazem = armazem
+        self.validade_anonima = validade_anonima
+        self.ttl_cache = ttl_cache
+        self.max_cache = max_cache
+        self.intervalo_limpeza = intervalo_limpeza
+        self._cache = OrderedDict()  # sid -> (dados, expira, valido_ate)
+        self._lock = threading.Lock()
+        self._proxima_limpeza = 0
+
+    def _guardar_cache(self, sid, dados, expira, agora):
+        with self._lock:
+            self._cache[sid] = (dados, expira, agora + self.ttl_cache)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.max_cache:
+                self._cache.popitem(last=False)
+
+    def carregar(self, sid):
+        """Devolve (dados, expira) da sessão, ou None se não existir ou tiver expirado."""
+        agora = time.time()
+        with self._lock:
+            entrada = self._cache.get(sid)
+            if entrada is not None:
+                if entrada[2] > agora and entrada[1] > agora:
+                    self._cache.move_to_end(sid)
+                    return entrada[0], entrada[1]
+                del self._cache[sid]
+        registro = self.armazem.obter(sid)
+        if registro is None or registro[1] <= agora:
+            return None
+        dados = self.serializer.loads(registro[0])
+        self._guardar_cache(sid, dados, registro[1], agora)
+        return dados, registro[1]
+
+    def _limpar_expiradas(self):
+        agora = time.time()
+        with self._lock:
+            if agora < self._proxima_limpeza:
+                return
+            self._proxima_limpeza = agora + self.intervalo_limpeza
+            for sid in [sid for sid, entrada in self._cache.items() if entrada[1] <= agora]:
+                del self._cache[sid]
+        removidas = self.armazem.expirar(agora)
+        if removidas:
+            logger.info("%d sessões expiradas apagadas", removidas)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            registro = self.carregar(sid)
+            if registro is not None:
+                return SessaoServidor(registro[0], sid, registro[1])
+        return SessaoServidor()
+
+    def save_session(self, app, session, response):
+        self._limpar_expiradas()
+        nome = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        caminho = self.get_cookie_path(app)
+
+        if session.sid is not None:
+            response.vary.add('Cookie')
+        if session.sid_anterior is not None:
+            self.armazem.apagar(session.sid_anterior)
+            with self._lock:
+                self._cache.pop(session.sid_anterior, None)
+        if not session:
+            if session.sid is not None and session.modified:
+                self.armazem.apagar(session.sid)
+                with self._lock:
+                    self._cache.pop(session.sid, None)
+                response.delete_cookie(nome, domain=dominio, path=caminho,
+                                       secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        agora = time.time()
+        if 'user' in session:
+            validade = app.permanent_session_lifetime.total_seconds()
+        else:
+            validade = self.validade_anonima
+        renovar = session.expira is not None and session.expira - agora < validade / 2
+        if session.sid is not None and not (session.modified or renovar):
+            return
+
+        novo = session.sid is None
+        if novo:
+            session.sid = secrets.token_urlsafe(16)
+        expira = agora + validade
+        dados = dict(session)
+        self.armazem.gravar(session.sid, self.serializer.dumps(dados), expira)
+        self._guardar_cache(session.sid, dados, expira, agora)
+        if novo or self.should_set_cookie(app, session):
+            response.set_cookie(nome, session.sid, expires=self.get_expiration_time(app, session),
+                                domain=dominio, path=caminho,
+                                secure=self.get_cookie_secure(app),
+                                httponly=self.get_cookie_httponly(app),
+                                samesite=self.get_cookie_samesite(app))
+            response.vary.add('Cookie')
+
+class ArmazemLimitesMemoria:
+    """Baldes de fichas num dicionário do próprio processo (um só worker)."""
+
+    def __init__(self):
+        self._baldes = {}  # chave -> [fichas, atualizado]
+        self._lock = threading.Lock()
+
+    def consumir(self, chave, capacidade, taxa, agora, custo=1):
+        """Tira `custo` fichas do balde, se as houver; devolve (permitido, fichas restantes)."""
+        with self._lock:
+            balde = self._baldes.get(chave)
+            if balde is None:
+                balde = self._baldes[chave] = [capacidade, agora]
+            fichas = min(capacidade, balde[0] + (agora - balde[1]) * taxa)
+            permitido = fichas >= custo
+            balde[0] = fichas - custo if permitido else fichas
+            balde[1] = agora
+            return permitido, balde[0]
+
+    def expirar(self, antes_de):
+        with self._lock:
+            for chave in [chave for chave, (_, atualizado) in self._baldes.items() if atualizado < antes_de]:
+                del self._baldes[chave]
+
+class ArmazemLimites:
+    """Baldes de fichas em SQLite, partilhados pelos workers da máquina
+    (mesma interface que ArmazemLimitesMemoria).
+
+    A reposição e o consumo são feitos numa única instrução (UPSERT com
+    RETURNING), por isso dois workers nunca gastam a mesma ficha.
+    """
+
+    ESQUEMA = [
+        """CREATE TABLE IF NOT EXISTS limites (
+            chave TEXT PRIMARY KEY,
+            fichas REAL NOT NULL,
+            atualizado REAL NOT NULL,
+            permitido INTEGER NOT NULL
+        )"""
+    ]
+
+    def __init__(self, pool):
+        self.pool = pool
+        with pool.conexao() as conexao:
+            for comando in self.ESQUEMA:
+                conexao.execute(comando)
+
+    def consumir(self, chave, capacidade, taxa, agora, custo=1):
+        reposto = "MIN(:capacidade, fichas + (:agora - atualizado) * :taxa)"
+        with self.pool.conexao() as conexao:
+            return tuple(conexao.execute(
+                f"""INSERT INTO limites (chave, fichas, atualizado, permitido)
+                    VALUES (:chave, :capacidade - (:capacidade >= :custo) * :custo, :agora,
+                            :capacidade >= :custo)
+                    ON CONFLICT (chave) DO UPDATE SET
+                        fichas = {reposto} - ({reposto} >= :custo) * :custo,
+                        permitido = {reposto} >= :custo,
+                        atualizado = :agora
+                    RETURNING permitido, fichas""",
+                {'chave': chave, 'capacidade': capacidade, 'taxa': taxa, 'agora': agora, 'custo': custo}
+            ).fetchone())
+
+    def expirar(self, antes_de):
+        with self.pool.conexao() as conexao:
+            conexao.execute("DELETE FROM limites WHERE atualizado < ?", (antes_de,))
+
+class LimitadorTaxa:
+    """Limites de taxa por balde de fichas (token bucket).
+
+    `regras` associa cada rota a uma lista de (dimensão, capacidade,
+    período): a dimensão é 'usuario', 'ip' ou 'usuario_ip' (o par) e
+    cada balde enche `capacidade` fichas por `período` segundos, que é
+    também a rajada máxima. Os baldes parados há mais de
+    `intervalo_limpeza` segundos são apagados de vez em quando (um balde
+    parado está cheio).
+    """
+
+    def __init__(self, armazem, regras, intervalo_limpeza=600):
+        self.armazem = armazem
+        self.regras = regras
+        self.intervalo_limpeza = intervalo_limpeza
+        self._proxima_limpeza = 0
+        self._lock = threading.Lock()
+
+    def verificar(self, rota, usuario, ip, custo=1):
+        """Consome `custo` fichas de cada balde da rota.
+
+        Devolve None se o pedido pode seguir, ou os segundos a esperar.
+        """
+        agora = time.time()
+        self._limpar(agora)
+        espera = None
+        for dimensao, capacidade, periodo in self.regras.get(rota, ()):
+            if dimensao == 'usuario':
+                valor = usuario
+            elif dimensao == 'ip':
+                valor = ip
+            else:
+                valor = usuario and ip and f"{usuario}@{ip}"
+            if not valor:
+                continue
+            taxa = capacidade / periodo
+            permitido, fichas = self.armazem.consumir(f"{rota}:{dimensao}:{valor}", capacidade, taxa,
+                                                      agora, custo)
+            if not permitido:
+                contar('planoaula_limitados_total', rota=rota, dimensao=dimensao)
+                espera = max(espera or 0, (custo - fichas) / taxa)
+        return espera
+
+    def _limpar(self, agora):
+        with self._lock:
+            if agora < self._proxima_limpeza:
+                return
+            self._proxima_limpeza = agora + self.intervalo_limpeza
+        self.armazem.expirar(agora - self.intervalo_limpeza)
+
+class ControloAdmissao:
+    """Controlo de admissão global do processo.
+
+    Recusa pedidos (o chamador responde 503 com Retry-After) quando há
+    `max_em_curso` pedidos em curso, ou quando a latência média recente
+    (média móvel exponencial) passa de `max_latencia` segundos e há pelo
+    menos `min_em_curso` pedidos em curso. Esta segunda condição deixa
+    sempre passar alguns pedidos, para que a média volte a descer quando
+    a sobrecarga termina.
+    """
+
+    def __init__(self, max_em_curso=64, max_latencia=1.0, min_em_curso=4, suavizacao=0.1):
+        self.max_em_curso = max_em_curso
+        self.max_latencia = max_latencia
+        self.min_em_curso = min_em_curso
+        self.suavizacao = suavizacao
+        self.em_curso = 0
+        self.latencia = 0.0
+        self.rejeitados = 0
+        self._lock = threading.Lock()
+
+    def entrar(self):
+        """Regista um pedido; devolve False se deve ser recusado."""
+        with self._lock:
+            if self.em_curso >= self.max_em_curso or (
+                    self.latencia > self.max_latencia and self.em_curso >= self.min_em_curso):
+                self.rejeitados += 1
+                return False
+            self.em_curso += 1
+            return True
+
+    def sair(self, duracao):
+        """Regista o fim de um pedido admitido e a sua duração."""
+        with self._lock:
+            self.em_curso -= 1
+            self.latencia += self.suavizacao * (duracao - self.latencia)
+
+    def espera_sugerida(self):
+        """Segundos para o Retry-After (pelo menos 1)."""
+        return max(1, math.ceil(self.latencia))
+
 # Instanciar o gerador
 generator = PlanoAulaGenerator()
 
+# Base de dados dos planos gerados
+PLANOAULA_DB = os.environ.get('PLANOAULA_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'planoaula.db'))
+pool_db = PoolConexoes(PLANOAULA_DB, tamanho=int(os.environ.get('PLANOAULA_DB_POOL', 8)))
+try:
+    indice_pesquisa = IndicePesquisa(pool_db)
+except sqlite3.OperationalError:  # SQLite compilado sem FTS5: sem pesquisa
+    logger.warning("SQLite sem FTS5; a pesquisa de planos fica desativada")
+    indice_pesquisa = None
+armazem_planos = ArmazemPlanos(pool_db, indice=indice_pesquisa)
+armazem_usuarios = ArmazemUsuarios(pool_db, workers=int(os.environ.get('PLANOAULA_KDF_WORKERS', 2)))
+armazem_usuarios.semear(USERS)
+
+# Sessões no servidor (PLANOAULA_SESSOES=memoria guarda-as só neste processo)
+armazem_sessoes = ArmazemSessoesMemoria() if os.environ.get('PLANOAULA_SESSOES') == 'memoria' else ArmazemSessoes(pool_db)
+app.session_interface = InterfaceSessoesServidor(
+    armazem_sessoes,
+    ttl_cache=float(os.environ.get('PLANOAULA_SESSAO_CACHE_TTL', 5)),
+    intervalo_limpeza=float(os.environ.get('PLANOAULA_SESSAO_LIMPEZA', 300)),
+    validade_anonima=float(os.environ.get('PLANOAULA_SESSAO_ANONIMA', 300))
+)
+
+def regra_limite(variavel, padrao):
+    """Lê uma regra de limite "N/S" (N pedidos por S segundos) do ambiente."""
+    capacidade, periodo = os.environ.get(variavel, padrao).split('/')
+    return int(capacidade), float(periodo)
+
+# Limites de taxa por usuário e por IP, em baldes partilhados pelos workers
+# (PLANOAULA_LIMITES=0 desativa; =memoria guarda-os só neste processo).
+# No login, o "usuário" é o nome tentado; o balde é por nome e IP, para que
+# tentativas vindas de outros IPs não bloqueiem o dono da conta.
+REGRAS_LIMITES = {
+    'gerar': [
+        ('usuario', *regra_limite('PLANOAULA_LIMITE_GERAR_USUARIO', '120/60')),
+        # Várias turmas de uma escola saem pelo mesmo IP
+        ('ip', *regra_limite('PLANOAULA_LIMITE_GERAR_IP', '600/60')),
+    ],
+    # Lotes: um balde próprio, contado em planos e não em pedidos. A
+    # capacidade limita também o maior lote aceite.
+    'lote': [
+        ('usuario', *regra_limite('PLANOAULA_LIMITE_LOTE_USUARIO', '100000/3600')),
+        ('ip', *regra_limite('PLANOAULA_LIMITE_LOTE_IP', '400000/3600')),
+    ],
+    'login': [
+        ('ip', *regra_limite('PLANOAULA_LIMITE_LOGIN_IP', '20/60')),
+        ('usuario_ip', *regra_limite('PLANOAULA_LIMITE_LOGIN_USUARIO', '10/300')),
+    ],
+}
+PLANOAULA_LIMITES = os.environ.get('PLANOAULA_LIMITES', 'sqlite')
+limitador = None
+if PLANOAULA_LIMITES != '0':
+    limitador = LimitadorTaxa(
+        ArmazemLimitesMemoria() if PLANOAULA_LIMITES == 'memoria' else ArmazemLimites(pool_db),
+        REGRAS_LIMITES
+    )
+
+def limite_excedido(rota, usuario, ip, custo=1):
+    """Segundos (inteiros) a esperar se o pedido excede um limite, senão None."""
+    if limitador is None:
+        return None
+    espera = limitador.verificar(rota, usuario, ip, custo)
+    return None if espera is None else max(1, math.ceil(espera))
+
+def resposta_limite(rota, espera):
+    """Resposta 429 a um pedido acima do limite de taxa."""
+    logger.warning("Limite de taxa excedido: usuário='%s', ip=%s", session['user'],
+                   request.remote_addr, extra={'rota': rota})
+    resposta = jsonify({'success': False, 'error': 'Demasiados pedidos, tente novamente em instantes.'})
+    resposta.status_code = 429
+    resposta.headers['Retry-After'] = str(espera)
+    return resposta
+
+def limitado(rota):
+    """Decorador que aplica os limites de taxa da rota ao usuário e ao IP.
+
+    Acima do limite responde 429 com Retry-After. Deve ficar depois de
+    @login_required.
+    """
+    def decorador(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            espera = limite_excedido(rota, session['user'], request.remote_addr)
+            if espera is not None:
+                return resposta_limite(rota, espera)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorador
+
+# Controlo de admissão das rotas pesadas, por processo (PLANOAULA_ADMISSAO_MAX=0
+# desativa): acima do limite de pedidos em curso ou da latência média, os
+# pedidos são recusados logo com 503 em vez de ficarem na fila.
+PLANOAULA_ADMISSAO_MAX = int(os.environ.get('PLANOAULA_ADMISSAO_MAX', 64))
+controlo_admissao = None
+if PLANOAULA_ADMISSAO_MAX > 0:
+    controlo_admissao = ControloAdmissao(
+        max_em_curso=PLANOAULA_ADMISSAO_MAX,
+        max_latencia=float(os.environ.get('PLANOAULA_ADMISSAO_LATENCIA', 1.0))
+    )
+ROTAS_ADMISSAO = {'login', 'gerar_plano', 'gerar_lote', 'exportar_plano', 'pesquisar_planos'}
+
+@app.before_request
+def admitir_pedido():
+    """Recusa com 503 e Retry-After os pedidos às rotas pesadas em sobrecarga."""
+    if controlo_admissao is None or request.endpoint not in ROTAS_ADMISSAO:
+        return None
+    if controlo_admissao.entrar():
+        g.admissao_inicio = time.perf_counter()
+        return None
+    contar('planoaula_rejeitados_total', rota=request.endpoint)
+    logger.warning("Pedido recusado por sobrecarga", extra={'rota': request.endpoint})
+    if request.endpoint == 'login':
+        flash('Servidor ocupado, tente novamente em instantes.', 'error')
+        resposta = app.make_response((render_template('login.html'), 503))
+    else:
+        resposta = jsonify({'success': False, 'error': 'Servidor ocupado, tente novamente em instantes.'})
+        resposta.status_code = 503
+    resposta.headers['Retry-After'] = str(controlo_admissao.espera_sugerida())
+    return resposta
+
+@app.after_request
+def libertar_admissao(resposta):
+    """Liberta a vaga do pedido. O corpo de uma resposta em streaming (NDJSON)
+    só é gerado depois de after_request, por isso a vaga fica ocupada até a
+    resposta ser fechada."""
+    inicio = g.pop('admissao_inicio', None)
+    if inicio is None:
+        return resposta
+    if resposta.is_streamed:
+        resposta.call_on_close(lambda: controlo_admissao.sair(time.perf_counter() - inicio))
+    else:
+        controlo_admissao.sair(time.perf_counter() - inicio)
+    return resposta
+
+@app.teardown_request
+def concluir_pedido(_erro):
+    # Erro sem resposta (after_request não correu)
+    inicio = g.pop('admissao_inicio', None)
+    if inicio is not None:
+        controlo_admissao.sair(time.perf_counter() - inicio)
+
+# Pool de processos para lotes grandes (PLANOAULA_WORKERS=0 desativa)
+PLANOAULA_WORKERS = int(os.environ.get('PLANOAULA_WORKERS', 0))
+gerador_paralelo = None
+if PLANOAULA_WORKERS > 0:
+    gerador_paralelo = GeradorParalelo(
+        workers=PLANOAULA_WORKERS,
+        tamanho_bloco=int(os.environ.get('PLANOAULA_TAMANHO_BLOCO', 256))
+    )
+    atexit.register(gerador_paralelo.shutdown)
+
+# Campos de um plano, na ordem dos argumentos de criar_plano
+CAMPOS_PLANO = ('tema', 'disciplina', 'classe', 'duracao', 'foco')
+
+# Número máximo de planos aceites num pedido de lote
+MAX_PLANOS_LOTE = int(os.environ.get('PLANOAULA_MAX_PLANOS_LOTE', 1000))
+# No modo streaming os planos não ficam em memória, por isso o limite é maior
+MAX_PLANOS_STREAM = int(os.environ.get('PLANOAULA_MAX_PLANOS_STREAM', 100000))
+
+# Cache de planos gerados (limites configuráveis por variáveis de ambiente)
+cache_planos = CachePlanos(
+    max_planos=int(os.environ.get('PLANOAULA_CACHE_MAX_PLANOS', 1024)),
+    max_bytes=int(os.environ.get('PLANOAULA_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+)
+
+def gerar_plano_cacheado(tema, disciplina, classe, duracao, foco, data=None):
+    """Gera o plano (PlanoAula), reutilizando o resultado em cache para o mesmo dia.
+
+    Como o PlanoAula memoriza o texto e a estrutura, um plano em cache também
+    não volta a ser formatado.
+    """
+    if data is None:
+        data = datetime.now().strftime("%d/%m/%Y")
+    chave = (generator.catalogo.atualizar(), tema, disciplina, classe, duracao, foco)
+    plano = cache_planos.get(chave, data)
+    if plano is None:
+        plano = generator.criar_plano(tema, disciplina, classe, duracao, foco, data)
+        cache_planos.put(chave, data, plano)
+    return plano
+
+# Exportações para download: formato -> (mimetype, extensão)
+FORMATOS_EXPORTACAO = {
+    'pdf': ('application/pdf', 'pdf'),
+    'docx': ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'docx'),
+    'html': ('text/html', 'html'),
+}
+
+# Arquivos exportados, em cache pelos dados de entrada (expiram com a data,
+# como os planos)
+cache_exportacoes = CachePlanos(
+    max_planos=int(os.environ.get('PLANOAULA_EXPORT_CACHE_MAX', 256)),
+    max_bytes=int(os.environ.get('PLANOAULA_EXPORT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+)
+
+# Pool de processos para PDF e DOCX (PLANOAULA_EXPORT_WORKERS=0 renderiza no pedido)
+exportador = ExportadorPlanos(workers=int(os.environ.get('PLANOAULA_EXPORT_WORKERS', 2)))
+atexit.register(exportador.shutdown)
+
+def chave_exportacao(formato, tema, disciplina, classe, duracao, foco, data):
+    """Impressão dos dados de entrada de uma exportação (chave do cache e ETag)."""
+    valores = (formato, str(generator.catalogo.atualizar()), tema, disciplina, classe, str(duracao), foco, data)
+    return hashlib.sha256("\0".join(valores).encode('utf-8')).hexdigest()[:32]
+
+def exportar_plano_cacheado(chave, formato, tema, disciplina, classe, duracao, foco, data):
+    """Devolve os bytes do plano exportado, reutilizando o cache (ver `chave_exportacao`)."""
+    arquivo = cache_exportacoes.get(chave, data)
+    if arquivo is None:
+        plano = gerar_plano_cacheado(tema, disciplina, classe, duracao, foco, data).como_dict()
+        if formato == 'html':
+            arquivo = render_template('plano.html', plano=plano,
+                                      cabecalho=exportacao.cabecalho(plano),
+                                      secoes=exportacao.secoes(plano),
+                                      colunas=exportacao.COLUNAS_CRONOGRAMA).encode('utf-8')
+        else:
+            arquivo = exportador.renderizar(formato, plano)
+        cache_exportacoes.put(chave, data, arquivo)
+    return arquivo
+
+def etag_plano(usuario, tema, disciplina, classe, duracao, foco, data, formato='texto'):
+    """ETag de um plano, calculado sem o gerar.
+
+    Combina os campos, a data, o formato da resposta e a impressão do
+    template compilado, de modo que muda quando o dia muda ou quando o
+    formato do plano é alterado.
+    """
+    template = generator.obter_template(disciplina, classe, foco, duracao)
+    valores = (usuario, tema, disciplina, classe, str(duracao), foco, data, formato, template.impressao)
+    return hashlib.sha256("\0".join(valores).encode('utf-8')).hexdigest()[:32]
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """Rota para login de usuários."""
@@ -239,16 +2304,31 @@ def login():
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '').strip()
         
-        logger.info(f"Tentativa de login: username='{username}'")
+        logger.info("Tentativa de login: username='%s'", username, extra={'rota': 'login'})
+
+        espera = limite_excedido('login', username, request.remote_addr)
+        if espera is not None:
+            flash('Demasiadas tentativas de login, tente novamente mais tarde.', 'error')
+            logger.warning("Login recusado por limite de taxa: username='%s', ip=%s", username,
+                           request.remote_addr, extra={'rota': 'login'})
+            return render_template('login.html'), 429, {'Retry-After': str(espera)}
         
-        if username in USERS and USERS[username] == password:
+        try:
+            valido = armazem_usuarios.verificar(username, password)
+        except SobrecargaAutenticacao:
+            flash('Servidor ocupado, tente novamente em instantes.', 'error')
+            logger.warning("Login recusado por sobrecarga: username='%s'", username, extra={'rota': 'login'})
+            return render_template('login.html'), 503
+
+        if valido:
+            session.regenerar()
             session['user'] = username
             flash('Login realizado com sucesso!', 'success')
-            logger.info(f"Login bem-sucedido: {username}")
+            logger.info("Login bem-sucedido: %s", username, extra={'rota': 'login'})
             return redirect(url_for('index'))
         else:
             flash('Usuário ou senha inválidos.', 'error')
-            logger.warning(f"Login falhou: username='{username}'")
+            logger.warning("Login falhou: username='%s'", username, extra={'rota': 'login'})
     
     return render_template('login.html')
 
@@ -261,6 +2341,7 @@ def logout():
     return redirect(url_for('login'))
 
 @app.route('/')
+@perfilavel
 @login_required
 def index():
     """Renderiza o formulário principal."""
@@ -271,49 +2352,336 @@ def index():
                            focos=generator.FOCOS,
                            user=session['user'])
 
-@app.route('/gerar', methods=['POST'])
+def formato_plano(dados):
+    """Formato pedido para o plano: 'json' (estruturado) ou 'texto'."""
+    formato = dados.get('formato') or dados.get('format')
+    return 'json' if formato == 'json' else 'texto'
+
+@app.route('/gerar', methods=['GET', 'POST'])
+@perfilavel
 @login_required
+@limitado('gerar')
 def gerar_plano():
-    """Gera o plano de aula a partir do formulário."""
+    """Gera o plano de aula a partir do formulário (POST) ou da query string (GET).
+
+    Por omissão `plano` é o texto formatado; com `formato=json` (ou
+    `format=json`) é o plano estruturado, sem formatação do texto.
+    A resposta leva um ETag; se o cliente o enviar em If-None-Match num
+    GET, a resposta é 304 sem que o plano seja gerado.
+    """
     try:
-        # Obter dados do formulário
-        tema = request.form.get('tema', '').strip()
-        disciplina = request.form.get('disciplina', '').strip()
-        classe = request.form.get('classe', '').strip()
-        duracao = request.form.get('duracao', '').strip()
-        foco = request.form.get('foco', '').strip()
+        with cronometro('pedido_gerar'):
+            # Obter dados do formulário
+            with cronometro('formulario'):
+                dados = request.form if request.method == 'POST' else request.args
+                tema = dados.get('tema', '').strip()
+                disciplina = dados.get('disciplina', '').strip()
+                classe = dados.get('classe', '').strip()
+                duracao = dados.get('duracao', '').strip()
+                foco = dados.get('foco', '').strip()
+                formato = formato_plano(dados)
 
-        # Log para depuração
-        logger.info(f"Dados recebidos: tema='{tema}', disciplina='{disciplina}', classe='{classe}', duracao='{duracao}', foco='{foco}'")
+            # Log para depuração
+            logger.info("Dados recebidos: tema='%s', disciplina='%s', classe='%s', duracao='%s', foco='%s'",
+                        tema, disciplina, classe, duracao, foco, extra={'rota': 'gerar'})
 
-        # Validar campos
-        if not all([tema, disciplina, classe, duracao, foco]):
-            logger.warning("Campos obrigatórios faltando")
-            return jsonify({'success': False, 'error': 'Todos os campos são obrigatórios'}), 400
+            # Validar campos
+            try:
+                with cronometro('validacao'):
+                    tema, disciplina, classe, duracao, foco = generator.validar(tema, disciplina, classe, duracao, foco)
+            except ValueError as e:
+                logger.warning("Dados inválidos: %s", e, extra={'rota': 'gerar'})
+                contar('planoaula_erros_total', rota='gerar', tipo='validacao')
+                return jsonify({'success': False, 'error': str(e)}), 400
+
+            # Pedido condicional: o cliente já tem este plano
+            data = datetime.now().strftime("%d/%m/%Y")
+            with cronometro('etag'):
+                etag = etag_plano(session['user'], tema, disciplina, classe, duracao, foco, data, formato)
+            contar('planoaula_pedidos_total', disciplina=disciplina, foco=foco)
+            # Num POST, If-None-Match é ignorado (RFC 9110: 304 só em GET/HEAD)
+            if request.method in ('GET', 'HEAD') and request.if_none_match.contains(etag):
+                contar('planoaula_nao_modificado_total')
+                resposta = Response(status=304)
+            else:
+                # Gerar plano
+                with cronometro('geracao'):
+                    plano = gerar_plano_cacheado(tema, disciplina, classe, duracao, foco, data)
+                with cronometro('persistencia'):
+                    plano_id = armazem_planos.salvar(session['user'], tema, disciplina, classe, duracao, foco, plano)
+                logger.info("Plano gerado com sucesso", extra={'rota': 'gerar'})
+                with cronometro('serializacao'):
+                    corpo = plano.como_dict() if formato == 'json' else plano.texto
+                    resposta = jsonify({'success': True, 'plano': corpo, 'id': plano_id})
+
+            # Resposta autenticada: só o navegador a guarda, revalidando sempre pelo ETag
+            resposta.set_etag(etag)
+            resposta.cache_control.private = True
+            resposta.cache_control.no_cache = True
+            return resposta
 
-        # Validar duração
+    except Exception as e:
+        logger.error("Erro ao gerar plano: %s", e, extra={'rota': 'gerar'})
+        contar('planoaula_erros_total', rota='gerar', tipo='interno')
+        return jsonify({'success': False, 'error': f'Erro interno: {str(e)}'}), 500
+
+@app.route('/exportar/<formato>')
+@login_required
+def exportar_plano(formato):
+    """Descarrega o plano em PDF, DOCX ou HTML (campos na query string, como em GET /gerar)."""
+    if formato not in FORMATOS_EXPORTACAO:
+        abort(404)
+    try:
+        tema, disciplina, classe, duracao, foco = generator.validar(
+            *(request.args.get(campo, '').strip() for campo in CAMPOS_PLANO)
+        )
+    except ValueError as e:
+        contar('planoaula_erros_total', rota='exportar', tipo='validacao')
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        data = datetime.now().strftime("%d/%m/%Y")
+        chave = chave_exportacao(formato, tema, disciplina, classe, duracao, foco, data)
+        if request.if_none_match.contains(chave):
+            resposta = Response(status=304)
+        else:
+            with cronometro(f'exportar_{formato}'):
+                arquivo = exportar_plano_cacheado(chave, formato, tema, disciplina, classe, duracao, foco, data)
+            contar('planoaula_exportacoes_total', formato=formato)
+            mimetype, extensao = FORMATOS_EXPORTACAO[formato]
+            nome = re.sub(r'[^\w-]+', '_', tema).strip('_')[:60] or 'plano'
+            resposta = Response(arquivo, mimetype=mimetype)
+            resposta.headers.set('Content-Disposition', 'attachment', filename=f'plano_{nome}.{extensao}')
+    except Exception as e:
+        logger.error("Erro ao exportar plano: %s", e, extra={'rota': 'exportar'})
+        contar('planoaula_erros_total', rota='exportar', tipo='interno')
+        return jsonify({'success': False, 'error': f'Erro interno: {str(e)}'}), 500
+
+    resposta.set_etag(chave)
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True
+    return resposta
+
+def gerador_para_lote(quantidade):
+    """Escolhe o gerador de um lote: o pool de processos para lotes grandes."""
+    if gerador_paralelo is not None and quantidade >= gerador_paralelo.tamanho_bloco:
+        return gerador_paralelo
+    return generator
+
+def validar_lote(itens):
+    """Valida todas as especificações de um lote numa única passagem.
+
+    Devolve (especificacoes, erros); `erros` lista o índice e a mensagem de
+    cada item inválido.
+    """
+    especificacoes = []
+    erros = []
+    for indice, item in enumerate(itens):
+        if not isinstance(item, dict):
+            erros.append({'indice': indice, 'error': 'Especificação inválida'})
+            continue
         try:
-            duracao = int(duracao)
-            if duracao not in generator.DURACOES:
-                raise ValueError("Duração inválida")
-        except ValueError:
-            logger.error("Duração inválida")
-            return jsonify({'success': False, 'error': 'Duração deve ser 45 ou 90 minutos'}), 400
+            especificacoes.append(generator.validar(*(item.get(campo) or '' for campo in CAMPOS_PLANO)))
+        except ValueError as e:
+            erros.append({'indice': indice, 'error': str(e)})
+    return especificacoes, erros
+
+def quer_streaming():
+    """Indica se o cliente pediu a resposta em NDJSON (streaming)."""
+    return (request.args.get('formato') == 'ndjson'
+            or request.accept_mimetypes.best == 'application/x-ndjson')
+
+def stream_ndjson(especificacoes):
+    """Resposta NDJSON: uma linha por plano, emitida assim que é gerado."""
+    def linhas():
+        indice = 0  # índice do plano a ser gerado
+        try:
+            gerador = gerador_para_lote(len(especificacoes))
+            for plano in gerador.iterar_planos(especificacoes):
+                yield json.dumps({'indice': indice, 'plano': plano}, ensure_ascii=False) + '\n'
+                indice += 1
+        except Exception as e:
+            logger.error("Erro ao gerar lote em streaming: %s", e, extra={'rota': 'lote'})
+            yield json.dumps({'indice': indice, 'error': f'Erro interno: {str(e)}'}, ensure_ascii=False) + '\n'
+
+    return Response(linhas(), mimetype='application/x-ndjson')
 
-        # Validar outros campos
-        if disciplina not in generator.DISCIPLINAS or classe not in generator.CLASSES or foco not in generator.FOCOS:
-            logger.error("Valores inválidos para disciplina, classe ou foco")
-            return jsonify({'success': False, 'error': 'Valores inválidos selecionados'}), 400
+@app.route('/gerar/lote', methods=['POST'])
+@perfilavel
+@login_required
+def gerar_lote():
+    """Gera vários planos a partir de uma lista JSON de especificações.
 
-        # Gerar plano
-        plano = generator.criar_plano(tema, disciplina, classe, duracao, foco)
-        logger.info("Plano gerado com sucesso")
-        return jsonify({'success': True, 'plano': plano})
+    Com `?formato=ndjson` (ou `Accept: application/x-ndjson`) os planos são
+    enviados um por linha à medida que são gerados. O limite de taxa conta
+    cada plano do lote.
+    """
+    try:
+        streaming = quer_streaming()
+        limite = MAX_PLANOS_STREAM if streaming else MAX_PLANOS_LOTE
+        itens = request.get_json(silent=True)
+        if not isinstance(itens, list) or not itens:
+            return jsonify({'success': False, 'error': 'Envie uma lista JSON de planos'}), 400
+        if len(itens) > limite:
+            return jsonify({'success': False, 'error': f'Máximo de {limite} planos por lote'}), 400
+
+        especificacoes, erros = validar_lote(itens)
+        if erros:
+            logger.warning("Lote com %d planos inválidos", len(erros), extra={'rota': 'lote'})
+            contar('planoaula_erros_total', rota='lote', tipo='validacao')
+            return jsonify({'success': False, 'error': 'Valores inválidos no lote', 'erros': erros}), 400
+
+        espera = limite_excedido('lote', session['user'], request.remote_addr, custo=len(especificacoes))
+        if espera is not None:
+            return resposta_limite('lote', espera)
+
+        if streaming:
+            logger.info("Lote de %d planos em streaming", len(especificacoes), extra={'rota': 'lote'})
+            return stream_ndjson(especificacoes)
+
+        planos = gerador_para_lote(len(especificacoes)).criar_planos(especificacoes)
+        logger.info("Lote de %d planos gerado com sucesso", len(planos), extra={'rota': 'lote'})
+        return jsonify({'success': True, 'planos': planos})
 
     except Exception as e:
-        logger.error(f"Erro ao gerar plano: {str(e)}")
+        logger.error("Erro ao gerar lote: %s", e, extra={'rota': 'lote'})
+        contar('planoaula_erros_total', rota='lote', tipo='interno')
         return jsonify({'success': False, 'error': f'Erro interno: {str(e)}'}), 500
 
+def parametros_paginacao():
+    """Lê `limite` e `pagina` da query string (limite máximo de 500)."""
+    limite = min(max(request.args.get('limite', 100, type=int), 1), 500)
+    pagina = max(request.args.get('pagina', 1, type=int), 1)
+    return limite, (pagina - 1) * limite
+
+@app.route('/planos')
+@login_required
+def meus_planos():
+    """Lista os planos do usuário; por omissão, os da semana atual."""
+    try:
+        hoje = date.today()
+        desde = request.args.get('desde')
+        ate = request.args.get('ate')
+        desde = date.fromisoformat(desde) if desde else hoje - timedelta(days=hoje.weekday())
+        ate = date.fromisoformat(ate) if ate else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+    limite, deslocamento = parametros_paginacao()
+    planos = armazem_planos.listar_por_usuario(session['user'], desde, ate, limite, deslocamento)
+    return jsonify({'success': True, 'planos': planos})
+
+@app.route('/planos/turma')
+@login_required
+def planos_turma():
+    """Lista os planos de todos os usuários para uma disciplina e classe."""
+    disciplina = request.args.get('disciplina', '').strip()
+    classe = request.args.get('classe', '').strip()
+    if disciplina not in generator.DISCIPLINAS or classe not in generator.CLASSES:
+        return jsonify({'success': False, 'error': 'Valores inválidos selecionados'}), 400
+    limite, deslocamento = parametros_paginacao()
+    planos = armazem_planos.listar_por_turma(disciplina, classe, request.args.get('tema', '').strip(),
+                                             limite, deslocamento)
+    return jsonify({'success': True, 'planos': planos})
+
+@app.route('/planos/historico')
+@login_required
+def historico_planos():
+    """Revisões dos planos do usuário para uma disciplina e classe."""
+    disciplina = request.args.get('disciplina', '').strip()
+    classe = request.args.get('classe', '').strip()
+    if disciplina not in generator.DISCIPLINAS or classe not in generator.CLASSES:
+        return jsonify({'success': False, 'error': 'Valores inválidos selecionados'}), 400
+    limite, deslocamento = parametros_paginacao()
+    revisoes = armazem_planos.historico(session['user'], disciplina, classe, limite, deslocamento)
+    return jsonify({'success': True, 'revisoes': revisoes})
+
+@app.route('/planos/armazenamento')
+@login_required
+def armazenamento_planos():
+    """Espaço poupado pelo histórico de revisões (de todos os usuários, para administradores com ?todos=1)."""
+    todos = request.args.get('todos') == '1' and session['user'] in ADMINISTRADORES
+    return jsonify({'success': True, **armazem_planos.estatisticas(None if todos else session['user'])})
+
+@app.route('/pesquisa')
+@login_required
+def pesquisar_planos():
+    """Pesquisa nos planos guardados (tema, objetivos, conteúdo e atividades).
+
+    `q` é a consulta (todos os termos têm de aparecer, sem ligar a acentos
+    nem a plurais); `disciplina`, `classe` (pode repetir-se) e `foco`
+    filtram os resultados, do mais recente ao mais antigo.
+    """
+    if indice_pesquisa is None:
+        return jsonify({'success': False, 'error': 'Pesquisa indisponível'}), 503
+    consulta = request.args.get('q', '').strip()
+    disciplina = request.args.get('disciplina', '').strip() or None
+    classes = [classe.strip() for classe in request.args.getlist('classe') if classe.strip()]
+    foco = request.args.get('foco', '').strip() or None
+    if not consulta:
+        return jsonify({'success': False, 'error': 'Indique o que pesquisar'}), 400
+    if ((disciplina and disciplina not in generator.DISCIPLINAS)
+            or any(classe not in generator.CLASSES for classe in classes)
+            or (foco and foco not in generator.FOCOS)):
+        return jsonify({'success': False, 'error': 'Valores inválidos selecionados'}), 400
+
+    limite, deslocamento = parametros_paginacao()
+    with cronometro('pesquisa'):
+        # Um resultado a mais indica se há outra página
+        ids = indice_pesquisa.pesquisar(consulta, disciplina, classes, foco, limite + 1, deslocamento)
+        planos = armazem_planos.listar_ids(ids[:limite])
+    return jsonify({'success': True, 'planos': planos, 'mais': len(ids) > limite})
+
+@app.route('/planos/<int:plano_id>')
+@login_required
+def obter_plano(plano_id):
+    """Devolve um plano guardado do usuário, sem o gerar de novo.
+
+    Os administradores podem ler os planos de qualquer usuário; para os
+    restantes, um plano de outro usuário é tratado como inexistente.
+    """
+    dono = None if session['user'] in ADMINISTRADORES else session['user']
+    registro = armazem_planos.obter(plano_id, dono)
+    if registro is None:
+        return jsonify({'success': False, 'error': 'Plano não encontrado'}), 404
+    return jsonify({'success': True, **registro})
+
+@app.route('/metrics')
+def exportar_metricas():
+    """Métricas da geração de planos no formato do Prometheus."""
+    if metricas is None:
+        abort(404)
+    cache = cache_planos.estatisticas()
+    extras = [
+        ('planoaula_cache_entradas', 'gauge', cache['entradas']),
+        ('planoaula_cache_bytes', 'gauge', cache['bytes']),
+        ('planoaula_cache_hits_total', 'counter', cache['hits']),
+        ('planoaula_cache_misses_total', 'counter', cache['misses']),
+        ('planoaula_cache_evictions_total', 'counter', cache['evictions']),
+        ('planoaula_cache_expirados_total', 'counter', cache['expirados']),
+    ]
+    return Response(metricas.exportar(extras), mimetype='text/plain; version=0.0.4')
+
+@app.route('/perfis')
+@admin_required
+def listar_perfis():
+    """Lista os perfis guardados, do mais lento para o mais rápido."""
+    return jsonify({'success': True, 'perfis': registo_perfis.listar()})
+
+@app.route('/perfis/<int:perfil_id>')
+@admin_required
+def obter_perfil(perfil_id):
+    """Devolve um perfil em formato de pilhas colapsadas."""
+    registro = registo_perfis.obter(perfil_id)
+    if registro is None:
+        abort(404)
+    return Response(registro['colapsado'], mimetype='text/plain')
+
+@app.route('/cache/estatisticas')
+@login_required
+def estatisticas_cache():
+    """Retorna os contadores do cache de planos."""
+    return jsonify(cache_planos.estatisticas())
+
 @app.route('/cadastro', methods=['GET', 'POST'])
 def cadastro():
     if request.method == 'POST':
@@ -321,536 +2689,124 @@ def cadastro():
         password = request.form.get('password', '').strip()
         if not username or not password:
             flash('Preencha todos os campos.', 'error')
-        elif username in USERS:
+        elif armazem_usuarios.existe(username):
             flash('Usuário já existe.', 'error')
         else:
-            USERS[username] = password
-            flash('Cadastro realizado com sucesso! Faça login.', 'success')
-            return redirect(url_for('login'))
+            try:
+                criado = armazem_usuarios.criar(username, password)
+            except SobrecargaAutenticacao:
+                flash('Servidor ocupado, tente novamente em instantes.', 'error')
+                return render_template('cadastro.html'), 503
+            if criado:
+                flash('Cadastro realizado com sucesso! Faça login.', 'success')
+                return redirect(url_for('login'))
+            flash('Usuário já existe.', 'error')
     return render_template('cadastro.html')
-if __name__ == '__main__':
-    # Criar pasta templates
-    os.makedirs('templates', exist_ok=True)
-
-    # Gerar login.html
-    login_html = """<!DOCTYPE html>
-<html lang="pt-BR">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Login - Gerador de Planos de Aula</title>
-    <style>
-        body {
-            font-family: 'Arial', sans-serif;
-            background: linear-gradient(135deg, #1e3a8a, #3b82f6);
-            min-height: 100vh;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            margin: 0;
-            padding: 20px;
-            color: #1f2937;
-        }
-        .container {
-            background: white;
-            border-radius: 12px;
-            padding: 2rem;
-            max-width: 400px;
-            width: 100%;
-            box-shadow: 0 10px 15px rgba(0, 0, 0, 0.2);
-        }
-        h1 {
-            font-size: 1.8rem;
-            text-align: center;
-            margin-bottom: 1.5rem;
-            color: #1e3a8a;
-        }
-        .form-group {
-            margin-bottom: 1rem;
-        }
-        label {
-            display: block;
-            font-weight: 600;
-            margin-bottom: 0.3rem;
-            color: #374151;
-        }
-        input {
-            width: 100%;
-            padding: 0.6rem;
-            border: 1px solid #d1d5db;
-            border-radius: 6px;
-            font-size: 1rem;
-            background: #f9fafb;
-            transition: border-color 0.2s;
-        }
-        input:focus {
-            outline: none;
-            border-color: #3b82f6;
-            box-shadow: 0 0 5px rgba(59, 130, 246, 0.5);
-        }
-        button {
-            background: #1e3a8a;
-            color: white;
-            padding: 0.8rem;
-            border: none;
-            border-radius: 6px;
-            font-size: 1rem;
-            cursor: pointer;
-            width: 100%;
-            margin-top: 1rem;
-            transition: background 0.2s;
-        }
-        button:hover {
-            background: #1e40af;
-        }
-        .message {
-            padding: 0.75rem;
-            border-radius: 6px;
-            margin-bottom: 1rem;
-            text-align: center;
-        }
-        .message.success {
-            background: #d1fae5;
-            color: #065f46;
-        }
-        .message.error {
-            background: #fef2f2;
-            color: #dc3545;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>Login</h1>
-        {% with messages = get_flashed_messages(with_categories=true) %}
-            {% if messages %}
-                {% for category, message in messages %}
-                    <div class="message {{ category }}">{{ message }}</div>
-                {% endfor %}
-            {% endif %}
-        {% endwith %}
-        <form method="POST" action="{{ url_for('login') }}">
-            <div class="form-group">
-                <label for="username">Usuário</label>
-                <input type="text" id="username" name="username" placeholder="Digite seu usuário" required>
-            </div>
-            <div class="form-group">
-                <label for="password">Senha</label>
-               <input type="password" id="password" name="password" placeholder="Digite sua senha" required>
-            </div>
-            <button type="submit">Entrar</button>
-        </form>
-        <div style="text-align:center; margin-top:1rem;">
-            <a href="{{ url_for('cadastro') }}">Não tem cadastro? Clique aqui</a>
-        </div>
-    </div>
-</body>
-</html>
-"""
-    with open('templates/login.html', 'w', encoding='utf-8') as f:
-        f.write(login_html)
-
-  # Gerar cadastro.html
-    cadastro_html = """<!DOCTYPE html>
-<html lang="pt-BR">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Cadastro - Gerador de Planos de Aula</title>
-    <style>
-        body {
-            font-family: 'Arial', sans-serif;
-            background: linear-gradient(135deg, #1e3a8a, #3b82f6);
-            min-height: 100vh;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            margin: 0;
-            padding: 20px;
-            color: #1f2937;
-        }
-        .container {
-            background: white;
-            border-radius: 12px;
-            padding: 2rem;
-            max-width: 400px;
-            width: 100%;
-            box-shadow: 0 10px 15px rgba(0, 0, 0, 0.2);
-        }
-        h1 {
-            font-size: 1.8rem;
-            text-align: center;
-            margin-bottom: 1.5rem;
-            color: #1e3a8a;
-        }
-        .form-group {
-            margin-bottom: 1rem;
-        }
-        label {
-            display: block;
-            font-weight: 600;
-            margin-bottom: 0.3rem;
-            color: #374151;
-        }
-        input {
-            width: 100%;
-            padding: 0.6rem;
-            border: 1px solid #d1d5db;
-            border-radius: 6px;
-            font-size: 1rem;
-            background: #f9fafb;
-            transition: border-color 0.2s;
-        }
-        input:focus {
-            outline: none;
-            border-color: #3b82f6;
-            box-shadow: 0 0 5px rgba(59, 130, 246, 0.5);
-        }
-        button {
-            background: #1e3a8a;
-            color: white;
-            padding: 0.8rem;
-            border: none;
-            border-radius: 6px;
-            font-size: 1rem;
-            cursor: pointer;
-            width: 100%;
-            margin-top: 1rem;
-            transition: background 0.2s;
-        }
-        button:hover {
-            background: #1e40af;
-        }
-        .message {
-            padding: 0.75rem;
-            border-radius: 6px;
-            margin-bottom: 1rem;
-            text-align: center;
-        }
-        .message.success {
-            background: #d1fae5;
-            color: #065f46;
-        }
-        .message.error {
-            background: #fef2f2;
-            color: #dc3545;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>Cadastro</h1>
-        {% with messages = get_flashed_messages(with_categories=true) %}
-            {% if messages %}
-                {% for category, message in messages %}
-                    <div class="message {{ category }}">{{ message }}</div>
-                {% endfor %}
-            {% endif %}
-        {% endwith %}
-        <form method="POST" action="{{ url_for('cadastro') }}">
-            <div class="form-group">
-                <label for="username">Usuário</label>
-                <input type="text" id="username" name="username" placeholder="Digite seu usuário" required>
-            </div>
-            <div class="form-group">
-                <label for="password">Senha</label>
-                <input type="password" id="password" name="password" placeholder="Digite sua senha" required>
-            </div>
-            <button type="submit">Cadastrar</button>
-        </form>
-        <div style="text-align:center; margin-top:1rem;">
-            <a href="{{ url_for('login') }}">Já tem cadastro? Faça login</a>
-        </div>
-    </div>
-</body>
-</html>
-"""
-    with open('templates/cadastro.html', 'w', encoding='utf-8') as f:
-        f.write(cadastro_html)
-
-    # Gerar index.html
-    index_html = """<!DOCTYPE html>
-<html lang="pt-BR">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Gerador de Planos de Aula</title>
-    <style>
-        body {
-            font-family: 'Arial', sans-serif;
-            background: linear-gradient(135deg, #1e3a8a, #3b82f6);
-            min-height: 100vh;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            margin: 0;
-            padding: 20px;
-            color: #1f2937;
-        }
-        .container {
-            background: white;
-            border-radius: 12px;
-            padding: 2rem;
-            max-width: 600px;
-            width: 100%;
-            box-shadow: 0 10px 15px rgba(0, 0, 0, 0.2);
-        }
-        h1 {
-            font-size: 1.8rem;
-            text-align: center;
-            margin-bottom: 1.5rem;
-            color: #1e3a8a;
-        }
-        .user-info {
-            text-align: right;
-            margin-bottom: 1rem;
-            font-size: 0.9rem;
-        }
-        .user-info a {
-            color: #3b82f6;
-            text-decoration: none;
-        }
-        .user-info a:hover {
-            text-decoration: underline;
-        }
-        .form-group {
-            margin-bottom: 1rem;
-        }
-        label {
-            display: block;
-            font-weight: 600;
-            margin-bottom: 0.3rem;
-            color: #374151;
-        }
-        input, select {
-            width: 100%;
-            padding: 0.6rem;
-            border: 1px solid #d1d5db;
-            border-radius: 6px;
-            font-size: 1rem;
-            background: #f9fafb;
-            transition: border-color 0.2s;
-        }
-        input:focus, select:focus {
-            outline: none;
-            border-color: #3b82f6;
-            box-shadow: 0 0 5px rgba(59, 130, 246, 0.5);
-        }
-        .form-row {
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 1rem;
-        }
-        button {
-            background: #1e3a8a;
-            color: white;
-            padding: 0.8rem;
-            border: none;
-            border-radius: 6px;
-            font-size: 1rem;
-            cursor: pointer;
-            width: 100%;
-            margin-top: 1rem;
-            transition: background 0.2s;
-        }
-        button:hover {
-            background: #1e40af;
-        }
-        .loading {
-            display: none;
-            text-align: center;
-            margin: 1rem 0;
-            flex-direction: column;
-            align-items: center;
-        }
-        .spinner {
-            border: 3px solid #e5e7eb;
-            border-top: 3px solid #1e3a8a;
-            border-radius: 50%;
-            width: 24px;
-            height: 24px;
-            animation: spin 1s linear infinite;
-            margin-bottom: 0.5rem;
-        }
-        @keyframes spin {
-            to { transform: rotate(360deg); }
-        }
-        .error {
-            background: #fef2f2;
-            color: #dc3545;
-            padding: 0.75rem;
-            border-radius: 6px;
-            margin: 1rem 0;
-            display: none;
-            text-align: center;
-        }
-        .resultado {
-            display: none;
-            margin-top: 1.5rem;
-            padding: 1rem;
-            background: #f3f4f6;
-            border-radius: 8px;
-        }
-        .plano-content {
-            white-space: pre-line;
-            font-family: 'Courier New', monospace;
-            background: white;
-            padding: 1rem;
-            border-radius: 6px;
-            border: 1px solid #e5e7eb;
-            overflow-x: auto;
-        }
-        .actions {
-            display: flex;
-            gap: 0.5rem;
-            margin-top: 1rem;
-        }
-        .btn-secondary {
-            background: #6b7280;
-            padding: 0.5rem;
-            font-size: 0.875rem;
-            flex: 1;
-        }
-        .btn-secondary:hover {
-            background: #4b5563;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="user-info">
-            Bem-vindo, {{ user }}! <a href="{{ url_for('logout') }}">Sair</a>
-        </div>
-        <h1>Gerador de Planos de Aula</h1>
-        <form id="plano-form">
-            <div class="form-group">
-                <label for="tema">Tema da Aula</label>
-                <input type="text" id="tema" name="tema" placeholder="Ex.: Revolução Francesa" required>
-            </div>
-            <div class="form-row">
-                <div class="form-group">
-                    <label for="disciplina">Disciplina</label>
-                    <select id="disciplina" name="disciplina" required>
-                        <option value="">Selecione...</option>
-                        {% for item in disciplinas %}
-                            <option value="{{ item }}">{{ item }}</option>
-                        {% endfor %}
-                    </select>
-                </div>
-                <div class="form-group">
-                    <label for="classe">Classe</label>
-                    <select id="classe" name="classe" required>
-                        <option value="">Selecione...</option>
-                        {% for item in classes %}
-                            <option value="{{ item }}">{{ item }}</option>
-                        {% endfor %}
-                    </select>
-                </div>
-            </div>
-            <div class="form-row">
-                <div class="form-group">
-                    <label for="duracao">Duração (min)</label>
-                    <select id="duracao" name="duracao" required>
-                        <option value="">Selecione...</option>
-                        {% for item in duracoes %}
-                            <option value="{{ item }}">{{ item }}</option>
-                        {% endfor %}
-                    </select>
-                </div>
-                <div class="form-group">
-                    <label for="foco">Foco da Aula</label>
-                    <select id="foco" name="foco" required>
-                        <option value="">Selecione...</option>
-                        {% for item in focos %}
-                            <option value="{{ item }}">{{ item }}</option>
-                        {% endfor %}
-                    </select>
-                </div>
-            </div>
-            <button type="submit">Gerar Plano</button>
-        </form>
-        <div class="loading" id="loading">
-            <div class="spinner"></div>
-            <span>Gerando plano...</span>
-        </div>
-        <div class="error" id="error"></div>
-        <div class="resultado" id="resultado">
-            <h3>Plano Gerado</h3>
-            <div class="plano-content" id="plano-content"></div>
-            <div class="actions">
-                <button class="btn-secondary" onclick="copyPlan()">Copiar</button>
-                <button class="btn-secondary" onclick="printPlan()">Imprimir</button>
-                <button class="btn-secondary" onclick="newPlan()">Gerar Novo Plano</button>
-            </div>
-        </div>
-    </div>
-    <script>
-        const form = document.getElementById('plano-form');
-        const loading = document.getElementById('loading');
-        const errorDiv = document.getElementById('error');
-        const resultado = document.getElementById('resultado');
-        const planoContent = document.getElementById('plano-content');
-
-        form.addEventListener('submit', (e) => {
-            e.preventDefault();
-            gerarPlano();
-        });
-
-        async function gerarPlano() {
-            try {
-                loading.style.display = 'flex';
-                errorDiv.style.display = 'none';
-                resultado.style.display = 'none';
-
-                const formData = new FormData(form);
-                const response = await fetch('/gerar', {
-                    method: 'POST',
-                    body: formData
-                });
-
-                const data = await response.json();
-                loading.style.display = 'none';
-
-                if (!data.success) {
-                    errorDiv.textContent = data.error;
-                    errorDiv.style.display = 'block';
-                } else {
-                    planoContent.textContent = data.plano;
-                    resultado.style.display = 'block';
-                    resultado.scrollIntoView({ behavior: 'smooth' });
-                }
-            } catch (err) {
-                loading.style.display = 'none';
-                errorDiv.textContent = `Erro: ${err.message}`;
-                errorDiv.style.display = 'block';
-            }
-        }
 
-        function copyPlan() {
-            navigator.clipboard.writeText(planoContent.textContent)
-                .then(() => alert('Plano copiado para a área de transferência!'))
-                .catch(() => alert('Erro ao copiar o plano.'));
-        }
+# Variantes pré-comprimidas dos arquivos estáticos, por ordem de preferência
+COMPRESSOES_ESTATICOS = [('br', '.br'), ('gzip', '.gz')]
+_impressoes_digitais = {}
 
-        function printPlan() {
-            const win = window.open('', '_blank');
-            win.document.write(`<pre style="font-family: monospace; padding: 20px;">${planoContent.textContent}</pre>`);
-            win.document.close();
-            win.print();
-        }
+def impressao_digital(filename):
+    """Hash curto do conteúdo de um arquivo estático (calculado uma vez)."""
+    digital = _impressoes_digitais.get(filename)
+    if digital is None:
+        caminho = safe_join(STATIC_DIR, filename)
+        with open(caminho, 'rb') as f:
+            digital = _impressoes_digitais[filename] = hashlib.sha256(f.read()).hexdigest()[:12]
+    return digital
 
-        function newPlan() {
-            form.reset();
-            resultado.style.display = 'none';
-            errorDiv.style.display = 'none';
-            window.scrollTo({ top: 0, behavior: 'smooth' });
-        }
-    </script>
-</body>
-</html>
-"""
-    with open('templates/index.html', 'w', encoding='utf-8') as f:
-        f.write(index_html)
+def url_asset(filename):
+    """URL de um arquivo estático com a impressão digital do conteúdo."""
+    return url_for('static', filename=filename, v=impressao_digital(filename))
+
+app.jinja_env.globals['url_asset'] = url_asset
+
+@app.route('/static/<path:filename>', endpoint='static')
+def arquivo_estatico(filename):
+    """Serve arquivos estáticos com ETag, variantes pré-comprimidas e cache longo.
+
+    Pedidos com a impressão digital correta (`?v=`) são marcados como
+    imutáveis; os restantes são revalidados pelo ETag.
+    """
+    caminho = safe_join(STATIC_DIR, filename)
+    if caminho is None or not os.path.isfile(caminho):
+        abort(404)
+
+    # Sem impressão digital válida, send_file marca a resposta como no-cache
+    imutavel = request.args.get('v') == impressao_digital(filename)
+    max_age = 365 * 24 * 3600 if imutavel else None
+
+    # Uma variante mais antiga que o original ficou desatualizada (o
+    # original foi editado sem voltar a correr `flask comprimir-estaticos`)
+    modificado = os.path.getmtime(caminho)
+    resposta = None
+    for codificacao, extensao in COMPRESSOES_ESTATICOS:
+        if codificacao in request.accept_encodings and os.path.isfile(caminho + extensao) \
+                and os.path.getmtime(caminho + extensao) >= modificado:
+            resposta = send_file(caminho + extensao, mimetype=mimetypes.guess_type(filename)[0],
+                                 conditional=True, max_age=max_age)
+            resposta.headers['Content-Encoding'] = codificacao
+            break
+    if resposta is None:
+        resposta = send_file(caminho, conditional=True, max_age=max_age)
 
+    resposta.vary.add('Accept-Encoding')
+    if imutavel:
+        resposta.cache_control.immutable = True
+    return resposta
+
+@app.cli.command('comprimir-estaticos')
+def comprimir_estaticos():
+    """Gera as variantes .gz (e .br, se o brotli estiver instalado) dos estáticos."""
+    extensoes = tuple(extensao for _, extensao in COMPRESSOES_ESTATICOS)
+    for pasta, _, arquivos in os.walk(STATIC_DIR):
+        for nome in arquivos:
+            if nome.endswith(extensoes):
+                continue
+            caminho = os.path.join(pasta, nome)
+            with open(caminho, 'rb') as f:
+                conteudo = f.read()
+            with open(caminho + '.gz', 'wb') as f:
+                f.write(gzip.compress(conteudo, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(caminho + '.br', 'wb') as f:
+                    f.write(brotli.compress(conteudo, quality=11))
+            logger.info("Comprimido: %s", os.path.relpath(caminho, STATIC_DIR))
+
+@app.cli.command('reindexar-pesquisa')
+def reindexar_pesquisa():
+    """Reconstrói o índice de pesquisa a partir dos planos guardados.
+
+    Os objetivos, conteúdos e atividades são gerados de novo a partir dos
+    campos de cada plano, com o catálogo de currículo atual.
+    """
+    if indice_pesquisa is None:
+        raise SystemExit("SQLite sem FTS5; a pesquisa de planos está desativada")
+    with pool_db.conexao() as conexao:
+        indice_pesquisa.limpar(conexao)
+        linhas = conexao.execute("SELECT id, tema, disciplina, classe, duracao, foco FROM planos").fetchall()
+        for plano_id, tema, disciplina, classe, duracao, foco in linhas:
+            plano = generator.estruturar_plano(tema, disciplina, classe, duracao, foco)
+            indice_pesquisa.indexar(conexao, plano_id,
+                                    indice_pesquisa.termos_plano(tema, disciplina, classe, foco, plano))
+    logger.info("Índice de pesquisa reconstruído: %d planos", len(linhas))
+
+# Compilar os templates uma só vez na importação; com `gunicorn --preload`
+# os workers partilham-nos após o fork
+for _template in ('login.html', 'cadastro.html', 'index.html', 'plano.html'):
+    app.jinja_env.get_template(_template)
+
+# Aquecimento opcional (PLANOAULA_AQUECER=1): todos os templates de planos
+# compilados antes do primeiro pedido. O gc.freeze() tira da recolha de lixo
+# os objetos já criados, para que não sejam tocados (e copiados) após o fork.
+if os.environ.get('PLANOAULA_AQUECER') == '1':
+    _inicio = time.perf_counter()
+    _aquecidos = generator.aquecer()
+    logger.info("Aquecimento: %d templates em %.0f ms", _aquecidos, (time.perf_counter() - _inicio) * 1000)
+    gc.freeze()
+
+if __name__ == '__main__':
+    # Servidor de desenvolvimento; em produção use `python servidor.py`
     logger.info("Servidor iniciando em http://localhost:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=os.environ.get('PLANOAULA_DEBUG') == '1', host='0.0.0.0', port=5000)
@@ -0,0 +1,160 @@
+"""Aplicação ASGI do gerador de planos.
+
+A rota /api/gerar é atendida de forma assíncrona, partilhando o gerador,
+o cache e o armazém de planos de `app`; a leitura da sessão e a gravação
+na base de dados correm numa thread à parte para não bloquear o event
+loop. Todas as outras rotas
+são encaminhadas para a aplicação Flask através do adaptador WSGI do
+asgiref.
+
+Uso: uvicorn asgi:aplicacao (ou python servidor.py)
+"""
+import asyncio
+import json
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from app import (app, generator, armazem_planos, gerar_plano_cacheado, etag_plano, formato_plano, logger,
+                 limite_excedido, controlo_admissao, contar)
+
+flask_asgi = WsgiToAsgi(app)
+
+
+async def usuario_da_sessao(scope):
+    """Lê o usuário da sessão do servidor indicada pelo cookie, ou None.
+
+    Usa o mesmo cache de sessões das rotas Flask deste worker; só uma
+    sessão fora do cache leva a uma consulta ao armazém, feita numa thread
+    à parte.
+    """
+    cabecalhos = dict(scope['headers'])
+    cookie = SimpleCookie(cabecalhos.get(b'cookie', b'').decode('latin-1'))
+    valor = cookie.get(app.config['SESSION_COOKIE_NAME'])
+    if valor is None:
+        return None
+    registro = await asyncio.to_thread(app.session_interface.carregar, valor.value)
+    if registro is None:
+        return None
+    return registro[0].get('user')
+
+
+async def ler_corpo(receive):
+    """Lê o corpo completo do pedido."""
+    partes = []
+    while True:
+        mensagem = await receive()
+        partes.append(mensagem.get('body', b''))
+        if not mensagem.get('more_body'):
+            return b''.join(partes)
+
+
+async def responder(send, status, corpo=None, cabecalhos=()):
+    """Envia uma resposta JSON (ou vazia, se `corpo` for None)."""
+    dados = b'' if corpo is None else json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+    cabecalhos = list(cabecalhos)
+    if corpo is not None:
+        cabecalhos.append((b'content-type', b'application/json'))
+    cabecalhos.append((b'content-length', str(len(dados)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': cabecalhos})
+    await send({'type': 'http.response.body', 'body': dados})
+
+
+async def api_gerar(scope, receive, send):
+    """Versão assíncrona de /gerar: campos em JSON (POST) ou na query string (GET).
+
+    Como em /gerar, `formato=json` devolve o plano estruturado, e aplicam-se
+    os mesmos limites de taxa e o mesmo controlo de admissão.
+    """
+    if controlo_admissao is None:
+        await gerar_admitido(scope, receive, send)
+        return
+    if not controlo_admissao.entrar():
+        contar('planoaula_rejeitados_total', rota='api_gerar')
+        espera = str(controlo_admissao.espera_sugerida()).encode()
+        await responder(send, 503, {'success': False, 'error': 'Servidor ocupado, tente novamente em instantes.'},
+                        [(b'retry-after', espera)])
+        return
+    inicio = time.perf_counter()
+    try:
+        await gerar_admitido(scope, receive, send)
+    finally:
+        controlo_admissao.sair(time.perf_counter() - inicio)
+
+
+async def gerar_admitido(scope, receive, send):
+    usuario = await usuario_da_sessao(scope)
+    if usuario is None:
+        await responder(send, 401, {'success': False, 'error': 'Faça login para acessar esta página.'})
+        return
+
+    cliente = scope.get('client')
+    espera = await asyncio.to_thread(limite_excedido, 'gerar', usuario, cliente[0] if cliente else None)
+    if espera is not None:
+        await responder(send, 429, {'success': False, 'error': 'Demasiados pedidos, tente novamente em instantes.'},
+                        [(b'retry-after', str(espera).encode())])
+        return
+
+    try:
+        if scope['method'] == 'POST':
+            dados = json.loads(await ler_corpo(receive) or b'{}')
+            if not isinstance(dados, dict):
+                raise ValueError('Envie um objeto JSON')
+        else:
+            dados = dict(parse_qsl(scope['query_string'].decode('utf-8')))
+    except ValueError:
+        await responder(send, 400, {'success': False, 'error': 'Pedido inválido'})
+        return
+
+    try:
+        tema, disciplina, classe, duracao, foco = generator.validar(
+            *(dados.get(campo) or '' for campo in ('tema', 'disciplina', 'classe', 'duracao', 'foco'))
+        )
+    except ValueError as e:
+        await responder(send, 400, {'success': False, 'error': str(e)})
+        return
+
+    try:
+        data = datetime.now().strftime("%d/%m/%Y")
+        formato = formato_plano(dados)
+        etag = f'"{etag_plano(usuario, tema, disciplina, classe, duracao, foco, data, formato)}"'
+        cabecalhos = [(b'etag', etag.encode()), (b'cache-control', b'private, no-cache')]
+        if_none_match = dict(scope['headers']).get(b'if-none-match', b'').decode('latin-1')
+        if scope['method'] == 'GET' and etag in (valor.strip() for valor in if_none_match.split(',')):
+            await responder(send, 304, cabecalhos=cabecalhos)
+            return
+
+        plano = gerar_plano_cacheado(tema, disciplina, classe, duracao, foco, data)
+        plano_id = await asyncio.to_thread(
+            armazem_planos.salvar, usuario, tema, disciplina, classe, duracao, foco, plano
+        )
+        corpo = plano.como_dict() if formato == 'json' else plano.texto
+        await responder(send, 200, {'success': True, 'plano': corpo, 'id': plano_id}, cabecalhos)
+    except Exception as e:
+        logger.error("Erro ao gerar plano: %s", e, extra={'rota': 'api_gerar'})
+        await responder(send, 500, {'success': False, 'error': f'Erro interno: {str(e)}'})
+
+
+ROTAS_ASSINCRONAS = {
+    '/api/gerar': api_gerar,
+}
+
+
+async def aplicacao(scope, receive, send):
+    """Ponto de entrada ASGI."""
+    if scope['type'] == 'lifespan':
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    rota = ROTAS_ASSINCRONAS.get(scope.get('path')) if scope['type'] == 'http' else None
+    if rota is not None and scope['method'] in ('GET', 'POST'):
+        await rota(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
@@ -0,0 +1,249 @@
+"""Teste de carga do fluxo login -> index -> gerar.
+
+Dois modos:
+    cliente  usa o test client do Flask, no próprio processo
+    http     lança o servidor localmente e usa vários clientes HTTP em paralelo
+
+Os pedidos a /gerar percorrem todas as combinações DISCIPLINAS x FOCOS x
+DURACOES. O relatório traz p50/p95/p99, pedidos por segundo e RSS, e pode
+ser gravado em JSON (--saida) para comparar entre commits.
+
+Uso:
+    python benchmarks/bench_carga.py cliente --pedidos 2000
+    python benchmarks/bench_carga.py http --clientes 16 --pedidos 5000 --saida carga.json
+"""
+import argparse
+import glob
+import http.cookiejar
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Base de dados temporária, para não tocar na base real
+os.environ.setdefault('PLANOAULA_DB', os.path.join(tempfile.mkdtemp(prefix='planoaula-bench-'), 'bench.db'))
+# Todos os clientes entram como o mesmo usuário: sem limites de taxa nem
+# controlo de admissão, que recusariam o próprio teste (o servidor lançado
+# no modo http herda estas variáveis)
+os.environ.setdefault('PLANOAULA_LIMITES', '0')
+os.environ.setdefault('PLANOAULA_ADMISSAO_MAX', '0')
+
+from app import PlanoAulaGenerator  # noqa: E402
+
+USUARIO = ('admin', 'senha123')
+
+
+def payloads():
+    """Ciclo infinito de formulários para /gerar, cobrindo todas as combinações."""
+    g = PlanoAulaGenerator
+    combinacoes = itertools.product(g.DISCIPLINAS, g.FOCOS, g.DURACOES)
+    classes = itertools.cycle(g.CLASSES)
+    formularios = [
+        {'tema': f"Tema {i}", 'disciplina': d, 'classe': next(classes), 'duracao': str(du), 'foco': f}
+        for i, (d, f, du) in enumerate(combinacoes)
+    ]
+    return itertools.cycle(formularios)
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def resumo(latencias, duracao_total):
+    """Estatísticas por rota, em milissegundos."""
+    rotas = {}
+    for rota, valores in latencias.items():
+        rotas[rota] = {
+            'pedidos': len(valores),
+            'p50_ms': percentil(valores, 50) * 1000,
+            'p95_ms': percentil(valores, 95) * 1000,
+            'p99_ms': percentil(valores, 99) * 1000,
+            'max_ms': max(valores) * 1000,
+        }
+    total = sum(len(v) for v in latencias.values())
+    return {'pedidos': total, 'segundos': duracao_total, 'pedidos_por_segundo': total / duracao_total, 'rotas': rotas}
+
+
+def rss_processo(pid):
+    """RSS atual de um processo em KiB (Linux), ou None."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for linha in f:
+                if linha.startswith('VmRSS:'):
+                    return int(linha.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def processos_descendentes(pid):
+    """O processo e todos os seus descendentes (Linux)."""
+    pids = [pid]
+    for atual in pids:
+        for tarefa in glob.glob(f'/proc/{atual}/task/*/children'):
+            try:
+                with open(tarefa) as f:
+                    pids.extend(int(filho) for filho in f.read().split())
+            except OSError:
+                pass
+    return pids
+
+
+def rss_arvore(pid):
+    """RSS somado do processo e dos seus descendentes (os workers do servidor), em KiB."""
+    return sum(rss_processo(atual) or 0 for atual in processos_descendentes(pid))
+
+
+def modo_cliente(args):
+    from app import app
+
+    cliente = app.test_client()
+    latencias = {'login': [], 'index': [], 'gerar': []}
+    formularios = payloads()
+
+    def medir(rota, funcao):
+        inicio = time.perf_counter()
+        resposta = funcao()
+        latencias[rota].append(time.perf_counter() - inicio)
+        if resposta.status_code >= 400:
+            raise RuntimeError(f"{rota}: HTTP {resposta.status_code}")
+
+    inicio = time.perf_counter()
+    medir('login', lambda: cliente.post('/login', data=dict(zip(('username', 'password'), USUARIO))))
+    for i in range(args.pedidos):
+        if i % args.gerar_por_index == 0:
+            medir('index', lambda: cliente.get('/'))
+        medir('gerar', lambda: cliente.post('/gerar', data=next(formularios)))
+    resultado = resumo(latencias, time.perf_counter() - inicio)
+    resultado['rss_max_kib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return resultado
+
+
+def lancar_servidor(porta, workers):
+    """Lança o servidor de produção (ou o do Flask, se o uvicorn não existir)."""
+    ambiente = dict(os.environ, PLANOAULA_PORT=str(porta), PLANOAULA_HOST='127.0.0.1',
+                    PLANOAULA_HTTP_WORKERS=str(workers))
+    try:
+        import uvicorn  # noqa: F401
+        comando = [sys.executable, 'servidor.py']
+    except ImportError:
+        comando = [sys.executable, '-c', f"from app import app; app.run(port={porta}, threaded=True)"]
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=ambiente,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{porta}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url + '/login', timeout=1)
+            return processo, url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    processo.terminate()
+    raise RuntimeError('O servidor não arrancou')
+
+
+def modo_http(args):
+    processo, url = lancar_servidor(args.porta, args.workers)
+    latencias = {'login': [], 'index': [], 'gerar': []}
+    lock = threading.Lock()
+    formularios = payloads()
+    rss_max = [rss_arvore(processo.pid)]
+
+    def cliente(pedidos):
+        abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        medidas = {'login': [], 'index': [], 'gerar': []}
+
+        def medir(rota, caminho, dados=None):
+            corpo = urllib.parse.urlencode(dados).encode() if dados is not None else None
+            inicio = time.perf_counter()
+            with abridor.open(url + caminho, data=corpo, timeout=30) as resposta:
+                resposta.read()
+            medidas[rota].append(time.perf_counter() - inicio)
+
+        medir('login', '/login', dict(zip(('username', 'password'), USUARIO)))
+        for i in range(pedidos):
+            if i % args.gerar_por_index == 0:
+                medir('index', '/')
+            with lock:
+                formulario = next(formularios)
+            medir('gerar', '/gerar', formulario)
+        with lock:
+            for rota, valores in medidas.items():
+                latencias[rota].extend(valores)
+
+    def vigiar_rss(parar):
+        while not parar.wait(0.2):
+            rss_max[0] = max(rss_max[0], rss_arvore(processo.pid))
+
+    parar = threading.Event()
+    vigia = threading.Thread(target=vigiar_rss, args=(parar,), daemon=True)
+    vigia.start()
+    try:
+        por_cliente = max(1, args.pedidos // args.clientes)
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clientes) as executor:
+            list(executor.map(cliente, [por_cliente] * args.clientes))
+        resultado = resumo(latencias, time.perf_counter() - inicio)
+    finally:
+        parar.set()
+        processo.terminate()
+        processo.wait()
+    resultado['clientes'] = args.clientes
+    resultado['workers'] = args.workers
+    # Pico da soma do RSS do servidor e dos seus workers
+    resultado['rss_max_kib'] = rss_max[0] or None
+    return resultado
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir(resultado):
+    print(f"{resultado['pedidos']} pedidos em {resultado['segundos']:.2f}s "
+          f"({resultado['pedidos_por_segundo']:.1f} pedidos/s), RSS máx. {resultado['rss_max_kib']} KiB")
+    for rota, r in resultado['rotas'].items():
+        print(f"  {rota:<6} n={r['pedidos']:<6} p50={r['p50_ms']:7.2f}ms p95={r['p95_ms']:7.2f}ms "
+              f"p99={r['p99_ms']:7.2f}ms max={r['max_ms']:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modo', choices=['cliente', 'http'])
+    parser.add_argument('--pedidos', type=int, default=1000, help='número de pedidos a /gerar')
+    parser.add_argument('--clientes', type=int, default=8, help='clientes em paralelo (modo http)')
+    parser.add_argument('--gerar-por-index', type=int, default=10, help='pedidos a /gerar por cada visita a /')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processos do servidor (modo http); fixo para comparar o RSS entre commits')
+    parser.add_argument('--porta', type=int, default=5099)
+    parser.add_argument('--saida', help='grava o resultado em JSON neste arquivo')
+    args = parser.parse_args()
+
+    resultado = modo_cliente(args) if args.modo == 'cliente' else modo_http(args)
+    resultado.update({'modo': args.modo, 'commit': commit_atual(), 'data': time.strftime('%Y-%m-%dT%H:%M:%S')})
+    imprimir(resultado)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark de memória: cronogramas de N planos mantidos em memória.
+
+Compara o pico de RSS da representação antiga (quatro dicionários por
+plano, montados a cada chamada) com LinhaCronograma (namedtuple com as
+partes fixas partilhadas). Cada variante corre num processo separado.
+
+Uso: python benchmarks/bench_memoria_cronograma.py [planos]
+"""
+import itertools
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def cronograma_dicts(generator, duracao, tema, foco):
+    """Cópia da implementação anterior de gerar_cronograma (dicionários)."""
+    tecnicas = generator.catalogo.obter(None, None, foco).tecnicas
+    if duracao == 90:
+        tempos = [10, 40, 30, 10]
+    else:
+        tempos = [5, 20, 15, 5]
+    return [
+        {
+            'tempo': f"{tempos[0]}'",
+            'funcao': 'Introdução e Motivação',
+            'conteudo': f"Apresentação de {tema}",
+            'ativ_professor': f"Introduzir {tema} e contextualizar.",
+            'ativ_aluno': 'Participar da discussão inicial.',
+            'tecnica': tecnicas[0],
+            'meios': generator.meios_ensino[0]
+        },
+        {
+            'tempo': f"{tempos[1]}'",
+            'funcao': 'Mediação e Assimilação',
+            'conteudo': f"Exploração detalhada de {tema}",
+            'ativ_professor': f"Explicar os conceitos principais de {tema}.",
+            'ativ_aluno': 'Anotar e fazer perguntas.',
+            'tecnica': tecnicas[1],
+            'meios': generator.meios_ensino[1]
+        },
+        {
+            'tempo': f"{tempos[2]}'",
+            'funcao': 'Domínio e Consolidação',
+            'conteudo': f"Aplicação prática de {tema}",
+            'ativ_professor': f"Orientar atividades práticas sobre {tema}.",
+            'ativ_aluno': 'Realizar exercícios ou projetos.',
+            'tecnica': tecnicas[2],
+            'meios': generator.meios_ensino[2]
+        },
+        {
+            'tempo': f"{tempos[3]}'",
+            'funcao': 'Controlo e Avaliação',
+            'conteudo': f"Avaliação de {tema}",
+            'ativ_professor': f"Avaliar o aprendizado sobre {tema}.",
+            'ativ_aluno': 'Responder a questões ou apresentar resultados.',
+            'tecnica': tecnicas[0],
+            'meios': generator.meios_ensino[3]
+        }
+    ]
+
+
+def medir(variante, quantidade):
+    """Gera e guarda os cronogramas; imprime o aumento do pico de RSS em KiB."""
+    from app import PlanoAulaGenerator
+
+    generator = PlanoAulaGenerator()
+    gerar = generator.gerar_cronograma if variante == 'linha' else (
+        lambda duracao, tema, foco: cronograma_dicts(generator, duracao, tema, foco))
+    combinacoes = itertools.cycle(itertools.product(generator.DURACOES, generator.FOCOS))
+    gerar(45, 'aquecimento', 'Teórica')
+
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cronogramas = [gerar(duracao, f"Tema {i}", foco) for i, (duracao, foco) in zip(range(quantidade), combinacoes)]
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(pico - base, len(cronogramas))
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--variante':
+        medir(sys.argv[2], int(sys.argv[3]))
+        return
+
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    resultados = {}
+    for variante in ('dict', 'linha'):
+        saida = subprocess.check_output(
+            [sys.executable, __file__, '--variante', variante, str(quantidade)],
+            stderr=subprocess.DEVNULL, text=True
+        )
+        resultados[variante] = int(saida.split()[0])
+
+    print(f"{quantidade} planos")
+    print(f"  dicionários:      {resultados['dict'] / 1024:8.1f} MiB")
+    print(f"  LinhaCronograma:  {resultados['linha'] / 1024:8.1f} MiB")
+    print(f"  redução:          {1 - resultados['linha'] / resultados['dict']:8.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Benchmark: vazão da geração em lote por número de processos.
+
+Uso: python benchmarks/bench_paralelo.py [planos] [tamanho_bloco]
+"""
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import GeradorParalelo, PlanoAulaGenerator  # noqa: E402
+
+
+def especificacoes(quantidade):
+    g = PlanoAulaGenerator
+    combinacoes = itertools.cycle(itertools.product(g.DISCIPLINAS, g.CLASSES, g.DURACOES, g.FOCOS))
+    return [(f"Tema {i}", d, c, du, f) for i, (d, c, du, f) in zip(range(quantidade), combinacoes)]
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    tamanho_bloco = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    specs = especificacoes(quantidade)
+
+    inicio = time.perf_counter()
+    referencia = PlanoAulaGenerator().criar_planos(specs)
+    base = quantidade / (time.perf_counter() - inicio)
+    print(f"{'em processo':>12}: {base:12,.0f} planos/s")
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        gerador = GeradorParalelo(workers=workers, tamanho_bloco=tamanho_bloco)
+        gerador.criar_planos(specs[:tamanho_bloco * workers])  # arranque dos processos
+        inicio = time.perf_counter()
+        planos = gerador.criar_planos(specs)
+        vazao = quantidade / (time.perf_counter() - inicio)
+        gerador.shutdown()
+        assert planos == referencia
+        print(f"{workers:>4} workers: {vazao:12,.0f} planos/s ({vazao / base:.2f}x)")
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark da pesquisa de planos: latência das consultas com N planos indexados.
+
+Preenche uma base temporária com N planos sintéticos (temas variados,
+todas as disciplinas, classes e focos) e mede p50/p95/máx de consultas
+típicas, com e sem filtros.
+
+Uso: python benchmarks/bench_pesquisa.py [planos]
+"""
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import IndicePesquisa, ArmazemPlanos, PlanoAulaGenerator, PoolConexoes  # noqa: E402
+
+TEMAS = ['Fotossíntese', 'Revolução Francesa', 'Equações do segundo grau', 'Células animais',
+         'Relevo de Angola', 'Leis de Newton', 'Tabela periódica', 'Verbos irregulares',
+         'Funções quadráticas', 'Ecossistemas', 'Independência nacional', 'Ligações químicas']
+
+CONSULTAS = [
+    {'consulta': 'fotossíntese'},
+    {'consulta': 'fotossintese', 'classes': ['10ª Classe', '11ª Classe', '12ª Classe']},
+    {'consulta': 'revoluções', 'disciplina': 'História', 'foco': 'Revisão'},
+    {'consulta': 'conceitos', 'disciplina': 'Física'},
+    {'consulta': 'células animais', 'classes': ['7ª Classe']},
+    {'consulta': 'tema 123456'},
+]
+
+
+def preencher(pool, indice, quantidade, bloco=5000):
+    generator = PlanoAulaGenerator()
+    combinacoes = itertools.cycle(itertools.product(
+        generator.DISCIPLINAS, generator.CLASSES, generator.FOCOS))
+    aleatorio = random.Random(1)
+    estruturas = {}
+    with pool.conexao() as conexao:
+        for inicio in range(0, quantidade, bloco):
+            for plano_id in range(inicio + 1, min(quantidade, inicio + bloco) + 1):
+                disciplina, classe, foco = next(combinacoes)
+                tema = f"{aleatorio.choice(TEMAS)} tema {plano_id}"
+                conexao.execute(
+                    "INSERT INTO planos (id, usuario, tema, disciplina, classe, duracao, foco, data, plano) "
+                    "VALUES (?, 'bench', ?, ?, ?, 45, ?, '2026-01-01', x'')",
+                    (plano_id, tema, disciplina, classe, foco))
+                chave = (disciplina, classe, foco)
+                if chave not in estruturas:
+                    estruturas[chave] = generator.estruturar_plano('\x00', disciplina, classe, 45, foco)
+                modelo = estruturas[chave]
+                plano = {campo: [texto.replace('\x00', tema) for texto in modelo[campo]]
+                         for campo in ('objetivos', 'conteudo', 'atividades')}
+                indice.indexar(conexao, plano_id, indice.termos_plano(tema, disciplina, classe, foco, plano))
+            conexao.commit()
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    pool = PoolConexoes(os.path.join(tempfile.mkdtemp(prefix='planoaula-bench-'), 'pesquisa.db'))
+    indice = IndicePesquisa(pool)
+    ArmazemPlanos(pool)
+
+    inicio = time.perf_counter()
+    preencher(pool, indice, quantidade)
+    print(f"{quantidade} planos indexados em {time.perf_counter() - inicio:.1f}s")
+
+    for parametros in CONSULTAS:
+        tempos = []
+        for pagina in range(20):
+            inicio = time.perf_counter()
+            indice.pesquisar(limite=21, deslocamento=(pagina % 5) * 20, **parametros)
+            tempos.append(time.perf_counter() - inicio)
+        tempos.sort()
+        print(f"  {parametros}: p50={tempos[len(tempos) // 2] * 1000:.2f}ms "
+              f"p95={tempos[int(len(tempos) * 0.95)] * 1000:.2f}ms max={tempos[-1] * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
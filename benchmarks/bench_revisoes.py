@@ -0,0 +1,61 @@
+"""Benchmark do histórico de revisões: espaço guardado e tempo de reconstrução.
+
+Simula professores que regeneram o plano várias vezes mudando o tema e
+compara os bytes guardados (deltas) com o texto inteiro comprimido com
+zlib, como era guardado antes.
+
+Uso: python benchmarks/bench_revisoes.py [usuarios] [revisoes]
+"""
+import itertools
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import ArmazemPlanos, PlanoAulaGenerator, PoolConexoes  # noqa: E402
+
+
+def main():
+    usuarios = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    revisoes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    generator = PlanoAulaGenerator()
+    caminho = os.path.join(tempfile.mkdtemp(prefix='planoaula-bench-'), 'revisoes.db')
+    armazem = ArmazemPlanos(PoolConexoes(caminho))
+
+    ids = []
+    bytes_zlib = 0
+    focos = itertools.cycle(generator.FOCOS)
+    inicio = time.perf_counter()
+    for u in range(usuarios):
+        disciplina = generator.DISCIPLINAS[u % len(generator.DISCIPLINAS)]
+        classe = generator.CLASSES[u % len(generator.CLASSES)]
+        for r in range(revisoes):
+            tema = f"Tema {u} revisão {r}"
+            foco = next(focos)
+            plano = generator.criar_plano(tema, disciplina, classe, 45, foco)
+            bytes_zlib += len(zlib.compress(plano.texto.encode('utf-8')))
+            ids.append(armazem.salvar(f"usuario{u}", tema, disciplina, classe, 45, foco, plano))
+    gravacao = time.perf_counter() - inicio
+
+    armazem = ArmazemPlanos(armazem.pool)  # sem a última revisão em memória
+    inicio = time.perf_counter()
+    for plano_id in ids:
+        armazem.obter(plano_id)
+    leitura = time.perf_counter() - inicio
+
+    estatisticas = armazem.estatisticas()
+    print(f"{len(ids)} planos ({usuarios} históricos x {revisoes} revisões)")
+    print(f"  texto:              {estatisticas['bytes_texto'] / 1024:10.1f} KiB")
+    print(f"  zlib (inteiros):    {bytes_zlib / 1024:10.1f} KiB")
+    print(f"  guardado (deltas):  {estatisticas['bytes_armazenados'] / 1024:10.1f} KiB "
+          f"({estatisticas['deltas']} deltas)")
+    print(f"  poupança vs. zlib:  {1 - estatisticas['bytes_armazenados'] / bytes_zlib:10.1%}")
+    print(f"  gravação:           {gravacao / len(ids) * 1e3:10.3f} ms/plano")
+    print(f"  reconstrução:       {leitura / len(ids) * 1e3:10.3f} ms/plano")
+
+
+if __name__ == '__main__':
+    main()
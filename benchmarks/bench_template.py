@@ -0,0 +1,33 @@
+"""Micro-benchmark: plano via template compilado vs. montagem direta.
+
+Mede também o plano estruturado (JSON), que não formata o texto.
+
+Uso: python benchmarks/bench_template.py [repeticoes]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import PlanoAulaGenerator  # noqa: E402
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    generator = PlanoAulaGenerator()
+    args = ('Revolução Francesa', 'História', '9ª Classe', 90, 'Teórica')
+    assert generator.criar_plano(*args).texto == generator.criar_plano_direto(*args)
+
+    direto = min(timeit.repeat(lambda: generator.criar_plano_direto(*args), number=repeticoes, repeat=5))
+    template = min(timeit.repeat(lambda: generator.criar_plano(*args).texto, number=repeticoes, repeat=5))
+    estruturado = min(timeit.repeat(lambda: generator.criar_plano(*args).como_dict(), number=repeticoes, repeat=5))
+
+    print(f"montagem direta:     {direto / repeticoes * 1e6:8.2f} us/plano")
+    print(f"template compilado:  {template / repeticoes * 1e6:8.2f} us/plano")
+    print(f"ganho:               {direto / template:8.2f}x")
+    print(f"estruturado (JSON):  {estruturado / repeticoes * 1e6:8.2f} us/plano")
+
+
+if __name__ == '__main__':
+    main()
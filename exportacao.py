@@ -0,0 +1,207 @@
+"""Exportação de planos de aula para PDF e DOCX.
+
+As funções recebem o plano estruturado (ver
+PlanoAulaGenerator.estruturar_plano) e devolvem os bytes do arquivo. Não
+dependem da aplicação Flask, para poderem correr num pool de processos, e
+não precisam de bibliotecas externas: o PDF usa as fontes padrão Courier e
+o DOCX é escrito diretamente em WordprocessingML.
+"""
+import io
+import textwrap
+import zipfile
+from xml.sax.saxutils import escape
+
+# Colunas do cronograma: (campo, título)
+COLUNAS_CRONOGRAMA = [
+    ('tempo', 'Tempo'),
+    ('funcao', 'Função Didática'),
+    ('conteudo', 'Conteúdo'),
+    ('ativ_professor', 'Atividades (Professor)'),
+    ('ativ_aluno', 'Atividades (Aluno)'),
+    ('tecnica', 'Técnica de Ensino'),
+    ('meios', 'Meios de Ensino'),
+]
+
+
+def cabecalho(plano):
+    """Linhas "campo: valor" do cabeçalho do plano."""
+    return [
+        ('Escola', plano['escola']),
+        ('Data', plano['data']),
+        ('Duração', f"{plano['duracao']} minutos"),
+        ('Disciplina', plano['disciplina']),
+        ('Classe, Turma', f"{plano['classe']}, {plano['turma']}"),
+        ('Unidade Temática', plano['unidade_tematica']),
+        ('Tema', plano['tema']),
+    ]
+
+
+def secoes(plano):
+    """Secções em lista do plano, pela ordem do texto: (título, itens)."""
+    return [
+        ('OBJETIVOS ESPECÍFICOS', plano['objetivos']),
+        ('CONTEÚDO', plano['conteudo']),
+        ('CRONOGRAMA', None),
+        ('RECURSOS DIDÁTICOS', plano['recursos']),
+        ('ATIVIDADES', plano['atividades']),
+        ('AVALIAÇÃO', plano['avaliacao']),
+        ('TAREFA DE CASA', plano['tarefa_casa']),
+    ]
+
+
+# --- PDF -------------------------------------------------------------------
+
+PDF_LARGURA, PDF_ALTURA = 595, 842  # A4 em pontos
+PDF_MARGEM = 50
+PDF_TAMANHOS = {'titulo': 16, 'secao': 12, 'normal': 10}
+
+
+def _pdf_texto(texto):
+    """Texto como string literal PDF (WinAnsiEncoding)."""
+    dados = texto.encode('cp1252', errors='replace')
+    dados = dados.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+    return b'(' + dados + b')'
+
+
+def _pdf_linhas(plano):
+    """Linhas do documento já quebradas: (estilo, texto)."""
+    # Courier: cada carácter ocupa 0,6 do tamanho da fonte
+    colunas = int((PDF_LARGURA - 2 * PDF_MARGEM) / (0.6 * PDF_TAMANHOS['normal']))
+    linhas = [('titulo', 'PLANO DE AULA'), ('normal', '')]
+    for campo, valor in cabecalho(plano):
+        linhas.extend(('normal', parte) for parte in textwrap.wrap(f"{campo}: {valor}", colunas))
+    for titulo, itens in secoes(plano):
+        linhas.extend([('normal', ''), ('secao', titulo)])
+        if itens is None:
+            for linha in plano['cronograma']:
+                linhas.append(('secao', f"{linha['tempo']} {linha['funcao']}"))
+                for campo, nome in COLUNAS_CRONOGRAMA[2:]:
+                    linhas.extend(('normal', parte) for parte in textwrap.wrap(
+                        f"{nome}: {linha[campo]}", colunas, initial_indent='  ', subsequent_indent='    '))
+            continue
+        for item in itens:
+            linhas.extend(('normal', parte) for parte in textwrap.wrap(
+                f"- {item}", colunas, subsequent_indent='  '))
+    return linhas
+
+
+def para_pdf(plano):
+    """Renderiza o plano como PDF (A4, texto em Courier)."""
+    paginas = [[]]
+    y = PDF_ALTURA - PDF_MARGEM
+    for estilo, texto in _pdf_linhas(plano):
+        altura = PDF_TAMANHOS[estilo] * 1.4
+        if y - altura < PDF_MARGEM:
+            paginas.append([])
+            y = PDF_ALTURA - PDF_MARGEM
+        y -= altura
+        if texto:
+            fonte = b'/F1' if estilo == 'normal' else b'/F2'
+            paginas[-1].append(b'BT %s %d Tf %d %.1f Td %s Tj ET' % (
+                fonte, PDF_TAMANHOS[estilo], PDF_MARGEM, y, _pdf_texto(texto)))
+
+    # Objetos: 1 catálogo, 2 páginas, 3 e 4 fontes, depois (página, conteúdo) por página
+    objetos = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>',
+    ]
+    referencias = []
+    for comandos in paginas:
+        conteudo = b'\n'.join(comandos)
+        numero = len(objetos) + 1
+        referencias.append(b'%d 0 R' % numero)
+        objetos.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                       b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+                       % (PDF_LARGURA, PDF_ALTURA, numero + 1))
+        objetos.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(conteudo), conteudo))
+    objetos[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(referencias), len(paginas))
+
+    saida = io.BytesIO()
+    saida.write(b'%PDF-1.4\n')
+    posicoes = []
+    for numero, objeto in enumerate(objetos, 1):
+        posicoes.append(saida.tell())
+        saida.write(b'%d 0 obj\n%s\nendobj\n' % (numero, objeto))
+    inicio_xref = saida.tell()
+    saida.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1))
+    for posicao in posicoes:
+        saida.write(b'%010d 00000 n \n' % posicao)
+    saida.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objetos) + 1, inicio_xref))
+    return saida.getvalue()
+
+
+# --- DOCX ------------------------------------------------------------------
+
+_DOCX_TIPOS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+</Types>"""
+
+_DOCX_RELACOES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+
+def _docx_paragrafo(texto, negrito=False, tamanho=None):
+    propriedades = ''
+    if negrito or tamanho:
+        propriedades = '<w:rPr>' + ('<w:b/>' if negrito else '') + \
+            (f'<w:sz w:val="{tamanho * 2}"/>' if tamanho else '') + '</w:rPr>'
+    return f'<w:p><w:r>{propriedades}<w:t xml:space="preserve">{escape(texto)}</w:t></w:r></w:p>'
+
+
+def _docx_tabela(cronograma):
+    borda = '<w:{0} w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
+    bordas = ''.join(borda.format(lado) for lado in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'))
+    linhas = [[nome for _, nome in COLUNAS_CRONOGRAMA]]
+    linhas.extend([linha[campo] for campo, _ in COLUNAS_CRONOGRAMA] for linha in cronograma)
+    xml = [f'<w:tbl><w:tblPr><w:tblW w:w="5000" w:type="pct"/><w:tblBorders>{bordas}</w:tblBorders></w:tblPr>']
+    for indice, celulas in enumerate(linhas):
+        xml.append('<w:tr>')
+        for celula in celulas:
+            xml.append(f'<w:tc>{_docx_paragrafo(celula, negrito=indice == 0, tamanho=9)}</w:tc>')
+        xml.append('</w:tr>')
+    xml.append('</w:tbl>')
+    return ''.join(xml)
+
+
+def para_docx(plano):
+    """Renderiza o plano como documento Word (.docx)."""
+    corpo = [_docx_paragrafo('PLANO DE AULA', negrito=True, tamanho=16)]
+    corpo.extend(_docx_paragrafo(f"{campo}: {valor}") for campo, valor in cabecalho(plano))
+    for titulo, itens in secoes(plano):
+        corpo.append(_docx_paragrafo(titulo, negrito=True, tamanho=12))
+        if itens is None:
+            corpo.append(_docx_tabela(plano['cronograma']))
+        else:
+            corpo.extend(_docx_paragrafo(f"• {item}") for item in itens)
+    documento = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+        + ''.join(corpo) +
+        '<w:sectPr><w:pgSz w:w="16838" w:h="11906" w:orient="landscape"/>'
+        '<w:pgMar w:top="1134" w:right="1134" w:bottom="1134" w:left="1134"/></w:sectPr>'
+        '</w:body></w:document>'
+    )
+    saida = io.BytesIO()
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as arquivo:
+        arquivo.writestr('[Content_Types].xml', _DOCX_TIPOS)
+        arquivo.writestr('_rels/.rels', _DOCX_RELACOES)
+        arquivo.writestr('word/document.xml', documento)
+    return saida.getvalue()
+
+
+RENDERIZADORES = {
+    'pdf': para_pdf,
+    'docx': para_docx,
+}
+
+
+def renderizar(formato, plano):
+    """Renderiza o plano no formato pedido ('pdf' ou 'docx')."""
+    return RENDERIZADORES[formato](plano)
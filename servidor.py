@@ -0,0 +1,25 @@
+"""Arranque de produção: serve `asgi:aplicacao` com uvicorn, sem modo debug.
+
+Configuração por variáveis de ambiente:
+    PLANOAULA_HOST          endereço (padrão 0.0.0.0)
+    PLANOAULA_PORT          porta (padrão 5000)
+    PLANOAULA_HTTP_WORKERS  processos do servidor (padrão: número de CPUs)
+"""
+import os
+
+import uvicorn
+
+
+def main():
+    uvicorn.run(
+        'asgi:aplicacao',
+        host=os.environ.get('PLANOAULA_HOST', '0.0.0.0'),
+        port=int(os.environ.get('PLANOAULA_PORT', 5000)),
+        workers=int(os.environ.get('PLANOAULA_HTTP_WORKERS', os.cpu_count() or 1)),
+        proxy_headers=True,
+        log_level='info',
+    )
+
+
+if __name__ == '__main__':
+    main()